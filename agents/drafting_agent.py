@@ -1,22 +1,113 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any, Optional, Callable
 from datetime import datetime
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from utils.api_clients import GroqClient
-from utils.rate_limiter import RateLimiter
+from utils.async_clients import generate_text
+from utils.rate_limiter import rate_limiter
+from utils.cancellation import CancellationToken, ResearchCancelled
 from models.database import update_chat
-from config import MIN_WORDS
+from utils.text_utils import tokenize
+from utils.prompt_budget import pack_references, output_token_budget
+from utils.tracing import traced, propagate
+from config import (
+    MIN_WORDS,
+    MAX_TOKENS,
+    DRAFTING_MODE,
+    SECTION_DRAFTING_WORKERS,
+    SECTION_REFERENCES,
+    SECTION_MAX_TOKENS
+)
 
 logger = logging.getLogger(__name__)
 
-# Initialize rate limiter
-rate_limiter = RateLimiter()
+REFINE_PROMPT = """
+Below is a research analysis on the topic "{query}", followed by additional research results that became available after it was written.
+
+Analysis:
+{analysis}
+
+Additional Research Results:
+{reference_content}
+
+Revise the analysis to incorporate the relevant information from the additional research results:
+1. Keep the existing structure, section headers and citations.
+2. Cite the additional results inline in the format (n), using the reference numbers shown above.
+3. Return the complete revised analysis, not only the changes.
+4. Do NOT include notes about what was changed.
+"""
+
+# Outline used when drafting the analysis section by section
+ANALYSIS_SECTIONS = [
+    {
+        "title": "Introduction",
+        "min_words": 250,
+        "citations": "2-3",
+        "focus": "Provide context and an overview of the topic, its background, definitions and why it matters"
+    },
+    {
+        "title": "Current State and Challenges",
+        "min_words": 400,
+        "citations": "4-5",
+        "focus": "Detail the current landscape, adoption, problems, limitations, risks and obstacles"
+    },
+    {
+        "title": "Key Technologies and Methods",
+        "min_words": 400,
+        "citations": "6-7",
+        "focus": "Technical deep dive into the technologies, methods, techniques, tools, models and architectures"
+    },
+    {
+        "title": "Implementation and Best Practices",
+        "min_words": 400,
+        "citations": "4-5",
+        "focus": "Practical guidelines, implementation steps, deployment, case studies, lessons and best practices"
+    },
+    {
+        "title": "Economic and Security Impact",
+        "min_words": 300,
+        "citations": "3-4",
+        "focus": "Business value, market, cost, economic impact, security, privacy, regulation and policy"
+    },
+    {
+        "title": "Future Perspectives",
+        "min_words": 150,
+        "citations": "3-4",
+        "focus": "Trends, predictions, research directions, opportunities and the future outlook"
+    },
+    {
+        "title": "Conclusion",
+        "min_words": 100,
+        "citations": "1-2",
+        "focus": "Summarize the key findings and their implications"
+    }
+]
+
+SECTION_PROMPT = """
+Write the "{title}" section of a comprehensive research analysis on the topic:
+
+Topic: {query}
+
+Section focus: {focus}
+
+Research Results:
+{reference_content}
+
+REQUIREMENTS:
+1. LENGTH: The section MUST be AT LEAST {min_words} words.
+2. CITATIONS: Cite {citations} of the references above using inline citations in the format (n), where n is the reference number shown above. Do NOT cite any other numbers.
+3. Start directly with the section text. Do NOT repeat the section title and do NOT add other section headers.
+4. Separate paragraphs with two newlines.
+5. Include specific examples, statistics and data points, and maintain a professional and academic tone.
+6. Do NOT include word count notes or formatting instructions in the output.
+"""
 
 class DraftingAgent:
     """Agent for drafting the final analysis based on research results"""
     
-    def __init__(self, chat_id: str, status_callback: Callable = None):
+    def __init__(self, chat_id: str, status_callback: Callable = None, cancel_token: Optional[CancellationToken] = None):
         """
         Initialize the drafting agent
         
@@ -25,17 +116,34 @@ class DraftingAgent:
             status_callback: Callback function for status updates
                 callback(progress: int, message: str, search_queries: Optional[List[str]], 
                         references: Optional[List[Dict]], analysis: Optional[str])
+            cancel_token (CancellationToken, optional): Token that aborts in-flight model calls
         """
         self.chat_id = chat_id
         self.status_callback = status_callback
+        self.cancel_token = cancel_token
+        self.pending_analysis = None
+        
+        # LLM tokens spent drafting, counted into the research's token usage
+        self.tokens_used = 0
+        self._usage_lock = threading.Lock()
     
-    def generate_analysis(self, query: str, references: List[Dict[str, Any]]) -> str:
+    def generate_analysis(
+        self,
+        query: str,
+        references: List[Dict[str, Any]],
+        mode: Optional[str] = None,
+        publish: bool = True
+    ) -> str:
         """
         Generate an analysis based on the research results
         
         Args:
             query (str): The original research query
             references (List[Dict]): The references to use for analysis
+            mode (str, optional): "single" for one completion or "sections" to draft
+                the sections concurrently. Defaults to DRAFTING_MODE.
+            publish (bool): Save and emit the analysis as completed. When False a
+                successful draft is kept in pending_analysis for publish_analysis.
         
         Returns:
             str: The generated analysis
@@ -79,6 +187,17 @@ You can try again with a new query or after resolving any API configuration issu
             
             return fallback_analysis
 
+        if (mode or DRAFTING_MODE) == "sections":
+            try:
+                analysis = self._generate_sectioned_analysis(query, references)
+                if analysis:
+                    return self._finish_draft(analysis, publish)
+                logger.warning(f"Section drafting failed for chat {self.chat_id}, falling back to a single completion")
+            except ResearchCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Error drafting sections for chat {self.chat_id}: {str(e)}")
+
         try:
             # Create a prompt template with cleaner formatting and stronger emphasis on length
             prompt_template = ChatPromptTemplate.from_template("""
@@ -91,7 +210,7 @@ Research Results:
 
 CRITICAL REQUIREMENTS:
 1. LENGTH: Your analysis MUST be AT LEAST 2000 words. This is a STRICT requirement.
-2. CITATIONS: You have {ref_count} references available. ONLY cite references that exist (1 to {ref_count}).
+2. CITATIONS: You have {ref_count} references available. ONLY cite the reference numbers listed in the research results above.
 3. FORMAT: Use inline citations in the format (n) where n is the reference number.
 4. SECTIONS: Each section must be separated by two newlines for proper formatting.
 
@@ -152,35 +271,37 @@ Remember:
             # Get an available model
             model_name = rate_limiter.get_available_model()
             
-            # Prepare reference content with better formatting
-            reference_texts = []
-            for i, ref in enumerate(references):
-                content = ref.get('content', '').strip()
-                if content:
-                    reference_texts.append(f"({i+1}) {ref['title']}:\n{content[:1000]}...\n")
-
-            reference_content = "\n".join(reference_texts)
+            # Fit the reference content into the model's context window
+            max_tokens = output_token_budget(model_name, MAX_TOKENS)
+            base_prompt = prompt_template.format(
+                query=query,
+                reference_content="",
+                ref_count=len(references),
+                min_words=MIN_WORDS
+            )
+            reference_content, packing = pack_references(references, model_name, base_prompt, max_tokens)
+            update_chat(self.chat_id, {"prompt_packing": {"mode": "single", **packing}})
             
-            logger.info(f"Generating analysis for chat {self.chat_id} with {len(references)} references")
+            logger.info(f"Generating analysis for chat {self.chat_id} with {packing['references_included']} of {len(references)} references")
             
             # Use the GroqClient with increased max_tokens
-            response = GroqClient.generate_text(
+            response = generate_text(
                 model=model_name,
                 prompt=prompt_template.format(
                     query=query,
                     reference_content=reference_content,
-                    ref_count=len(references),
+                    ref_count=packing["references_included"],
                     min_words=MIN_WORDS
                 ),
                 system_prompt="You are a research assistant helping with deep analysis. Your task is to write a COMPREHENSIVE analysis that is AT LEAST 2000 words long and cites ALL available references.",
                 temperature=0.3,
-                max_tokens=8000  # Increased to allow for longer responses
+                max_tokens=max_tokens,
+                cancel_token=self.cancel_token
             )
             
             # Update rate limits
             rate_limiter.update_rate_limits(model_name, "request")
-            if response and 'usage' in response and 'total_tokens' in response['usage']:
-                rate_limiter.update_rate_limits(model_name, "tokens", response['usage']['total_tokens'])
+            self._record_tokens(model_name, response)
             
             # Extract and validate analysis from response
             if response and 'choices' in response:
@@ -190,30 +311,256 @@ Remember:
                     logger.error(f"Generated analysis is too short or empty for chat {self.chat_id}")
                     return "Error: Generated analysis is too short or empty. Please try again."
                 
-                # Save the analysis to MongoDB
-                update_chat(
-                    self.chat_id,
-                    {
-                        "analysis": analysis,
-                        "completed_at": datetime.now(),
-                        "status": "completed"
-                    }
-                )
-                
-                logger.info(f"Successfully generated analysis for chat {self.chat_id}")
-                
-                # Emit the final analysis through the callback
-                if self.status_callback:
-                    self.status_callback(100, "Research completed", None, None, analysis)
-                
-                return analysis
+                return self._finish_draft(analysis, publish)
             else:
                 error_msg = "Failed to generate analysis - no valid response from model"
                 logger.error(f"{error_msg} for chat {self.chat_id}")
                 return error_msg
                 
+        except ResearchCancelled:
+            raise
         except Exception as e:
             error_msg = f"Error analyzing results: {str(e)}"
             logger.error(f"{error_msg} for chat {self.chat_id}")
             return error_msg
 
+
+    def _record_tokens(self, model_name: str, response: Optional[Dict[str, Any]]) -> None:
+        """Count the tokens of a response against the model's rate limit and the drafting usage"""
+        if response and 'usage' in response and 'total_tokens' in response['usage']:
+            tokens = response['usage']['total_tokens']
+            rate_limiter.update_rate_limits(model_name, "tokens", tokens)
+            with self._usage_lock:
+                self.tokens_used += tokens
+    
+    def _finish_draft(self, analysis: str, publish: bool) -> str:
+        """Publish a successful draft, or keep it pending for a later refinement"""
+        if publish:
+            return self.publish_analysis(analysis)
+        
+        self.pending_analysis = analysis
+        return analysis
+    
+    def publish_analysis(self, analysis: str) -> str:
+        """Save the finished analysis and emit it through the callback"""
+        self.pending_analysis = None
+        
+        # Save the analysis to MongoDB
+        update_chat(
+            self.chat_id,
+            {
+                "analysis": analysis,
+                "completed_at": datetime.now(),
+                "status": "completed"
+            }
+        )
+        
+        logger.info(f"Successfully generated analysis for chat {self.chat_id}")
+        
+        # Emit the final analysis through the callback
+        if self.status_callback:
+            self.status_callback(100, "Research completed", None, None, analysis)
+        
+        return analysis
+    
+    def refine_analysis(self, query: str, analysis: str, references: List[Dict[str, Any]], new_indices: List[int]) -> Optional[str]:
+        """
+        Revise a drafted analysis to take in references that arrived after drafting started
+        
+        Args:
+            query (str): The original research query
+            analysis (str): The drafted analysis
+            references (List[Dict]): All references, including the new ones
+            new_indices (List[int]): Indices of the references not yet used in the analysis
+        
+        Returns:
+            Optional[str]: The revised analysis, or None if the revision failed
+        """
+        model_name = rate_limiter.acquire_model()
+        max_tokens = output_token_budget(model_name, MAX_TOKENS)
+        
+        reference_content, packing = pack_references(
+            references,
+            model_name,
+            REFINE_PROMPT.format(query=query, analysis=analysis, reference_content=""),
+            max_tokens,
+            indices=new_indices
+        )
+        if not packing["references_included"]:
+            logger.warning(f"No room to add late references to the analysis for chat {self.chat_id}")
+            return None
+        
+        if self.status_callback:
+            self.status_callback(95, f"Refining analysis with {packing['references_included']} late references")
+        
+        response = generate_text(
+            model=model_name,
+            prompt=REFINE_PROMPT.format(query=query, analysis=analysis, reference_content=reference_content),
+            system_prompt="You are a research assistant helping with deep analysis. You revise existing analyses to include new sources.",
+            temperature=0.3,
+            max_tokens=max_tokens,
+            cancel_token=self.cancel_token
+        )
+        
+        self._record_tokens(model_name, response)
+        
+        if response and 'choices' in response:
+            revised = response['choices'][0]['message']['content']
+            # A much shorter result means the model returned a summary or only the changes
+            if revised and len(revised.strip()) >= 0.8 * len(analysis.strip()):
+                return revised
+        
+        logger.warning(f"Refining the analysis failed for chat {self.chat_id}, keeping the draft")
+        return None
+    
+    def _assign_references(self, query: str, references: List[Dict[str, Any]]) -> List[List[int]]:
+        """
+        Choose the most relevant references for each section by keyword overlap
+        with the section focus and the query. Every reference is given to at least one section.
+        
+        Args:
+            query (str): The original research query
+            references (List[Dict]): The references to distribute
+        
+        Returns:
+            List[List[int]]: Reference indices for each section in ANALYSIS_SECTIONS
+        """
+        query_terms = set(tokenize(query))
+        reference_terms = [set(tokenize(f"{ref.get('title', '')} {ref.get('content', '')}")) for ref in references]
+        
+        scores = []
+        for section in ANALYSIS_SECTIONS:
+            section_terms = set(tokenize(section["focus"])) | query_terms
+            scores.append([
+                len(section_terms & terms) / (len(section_terms) or 1) + 0.1 * float(ref.get('score', 0) or 0)
+                for ref, terms in zip(references, reference_terms)
+            ])
+        
+        assignments = []
+        for section_scores in scores:
+            ranked = sorted(range(len(references)), key=lambda i: section_scores[i], reverse=True)
+            assignments.append(ranked[:SECTION_REFERENCES])
+        
+        # Give unassigned references to the section they match best
+        assigned = {i for indices in assignments for i in indices}
+        for i in range(len(references)):
+            if i not in assigned:
+                best_section = max(range(len(ANALYSIS_SECTIONS)), key=lambda s: scores[s][i])
+                assignments[best_section].append(i)
+        
+        return [sorted(indices) for indices in assignments]
+    
+    def _draft_section(
+        self,
+        query: str,
+        section: Dict[str, Any],
+        references: List[Dict[str, Any]],
+        indices: List[int],
+        packings: List[Dict[str, Any]],
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Optional[str]:
+        """
+        Draft one section of the analysis, retrying once on another model if the call fails
+        
+        Args:
+            query (str): The original research query
+            section (Dict): The section outline entry
+            references (List[Dict]): All references
+            indices (List[int]): Indices of the references given to this section
+            packings (List[Dict]): List the prompt packing decisions are appended to
+            cancel_token (CancellationToken, optional): Token that aborts the section's model calls
+        
+        Returns:
+            Optional[str]: The section text, or None if drafting failed
+        """
+        prompt_fields = {
+            "title": section["title"],
+            "query": query,
+            "focus": section["focus"],
+            "min_words": section["min_words"],
+            "citations": section["citations"]
+        }
+        
+        for attempt in range(2):
+            # Count the request against the least loaded model up front so concurrent sections spread across models
+            model_name = rate_limiter.acquire_model()
+            max_tokens = output_token_budget(model_name, SECTION_MAX_TOKENS)
+            
+            # Keep the global reference numbers so citations are consistent across sections
+            reference_content, packing = pack_references(
+                references,
+                model_name,
+                SECTION_PROMPT.format(reference_content="", **prompt_fields),
+                max_tokens,
+                indices=indices
+            )
+            packings.append({"section": section["title"], **packing})
+            
+            response = generate_text(
+                model=model_name,
+                prompt=SECTION_PROMPT.format(reference_content=reference_content, **prompt_fields),
+                system_prompt="You are a research assistant helping with deep analysis. You write one section of a longer report at a time.",
+                temperature=0.3,
+                max_tokens=max_tokens,
+                cancel_token=cancel_token
+            )
+            
+            self._record_tokens(model_name, response)
+            
+            if response and 'choices' in response:
+                content = response['choices'][0]['message']['content'].strip()
+                if content:
+                    return content
+            
+            logger.warning(f"Attempt {attempt + 1} to draft section '{section['title']}' failed for chat {self.chat_id}")
+        
+        return None
+    
+    def _generate_sectioned_analysis(self, query: str, references: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Draft all sections concurrently and stitch them together
+        
+        Args:
+            query (str): The original research query
+            references (List[Dict]): The references to use for analysis
+        
+        Returns:
+            Optional[str]: The stitched analysis, or None if any section failed
+        """
+        assignments = self._assign_references(query, references)
+        total = len(ANALYSIS_SECTIONS)
+        packings = []
+        
+        logger.info(f"Drafting {total} sections concurrently for chat {self.chat_id} with {len(references)} references")
+        
+        # Cancelled when one section fails, so the others stop instead of running to completion
+        sections_token = self.cancel_token.child() if self.cancel_token else CancellationToken()
+        executor = ThreadPoolExecutor(max_workers=SECTION_DRAFTING_WORKERS, thread_name_prefix="draft")
+        futures = {
+            executor.submit(
+                propagate(traced(f"draft_section: {section['title']}", self._draft_section)),
+                query, section, references, indices, packings, sections_token
+            ): i
+            for i, (section, indices) in enumerate(zip(ANALYSIS_SECTIONS, assignments))
+        }
+        
+        sections = {}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                content = future.result()
+                if not content:
+                    logger.warning(f"Section '{ANALYSIS_SECTIONS[i]['title']}' failed for chat {self.chat_id}, cancelling the other sections")
+                    return None
+                sections[i] = f"{ANALYSIS_SECTIONS[i]['title']}\n\n{content}"
+                
+                if self.status_callback:
+                    self.status_callback(70 + int(25 * len(sections) / total), f"Drafted section {len(sections)}/{total}: {ANALYSIS_SECTIONS[i]['title']}")
+        finally:
+            # Stops the sections still running after a failure; after success it only detaches the token
+            sections_token.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        update_chat(self.chat_id, {"prompt_packing": {"mode": "sections", "sections": packings}})
+        
+        return "\n\n".join(sections[i] for i in range(total))
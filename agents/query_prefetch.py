@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Tuple
+from utils.api_clients import GroqClient
+from utils.async_clients import generate_text
+from utils.rate_limiter import rate_limiter
+from utils.text_utils import normalize_query
+from utils.metrics import CACHE_REQUESTS
+from config import (
+    PREFETCH_TTL,
+    PREFETCH_MIN_CHARS,
+    PREFETCH_MAX_INFLIGHT,
+    PREFETCH_MAX_ENTRIES,
+    PREFETCH_BUDGET_SHARE,
+    PREFETCH_JOIN_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+def search_queries_prompt(query: str) -> str:
+    """Prompt for the initial search queries of a research, shared by the research agent and prefetching"""
+    return f"""
+        Generate 5 specific search queries to thoroughly research the following topic:
+        
+        {query}
+        
+        Format the queries as a JSON array of strings.
+        """
+
+class _Prefetch:
+    """A prefetch that is running or finished"""
+    
+    __slots__ = ("future", "created_at")
+    
+    def __init__(self, future):
+        self.future = future
+        self.created_at = time.time()
+
+class QueryPrefetcher:
+    """
+    Generates the search queries of a research while its query is still being typed.
+    
+    Prefetches are keyed like coalesced researches (normalize_query), expire after
+    PREFETCH_TTL and only start on a model that has used less than the budget share
+    of its per-minute limits. Their calls count against that model's limits like any
+    other, so abandoned prefetches cost research at most that share of the budget.
+    """
+    
+    def __init__(
+        self,
+        ttl: float = PREFETCH_TTL,
+        max_inflight: int = PREFETCH_MAX_INFLIGHT,
+        max_entries: int = PREFETCH_MAX_ENTRIES,
+        budget_share: float = PREFETCH_BUDGET_SHARE
+    ):
+        """
+        Initialize the prefetcher
+        
+        Args:
+            ttl (float): Seconds a prefetch stays usable after it starts
+            max_inflight (int): Prefetches generated at the same time
+            max_entries (int): Prefetches kept, oldest dropped first
+            budget_share (float): Usage share of a model's per-minute limits below which prefetches may start on it
+        """
+        self.ttl = ttl
+        self.max_inflight = max_inflight
+        self.max_entries = max_entries
+        self.budget_share = budget_share
+        self._entries = OrderedDict()
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="prefetch")
+    
+    def prefetch(self, query: str) -> str:
+        """
+        Start generating search queries for a draft query unless they are already cached or running
+        
+        Args:
+            query (str): The query as typed so far
+        
+        Returns:
+            str: "cached", "pending", "started", or "skipped" when the draft is too short
+                or there is no spare capacity
+        """
+        query = query.strip()
+        if len(query) < PREFETCH_MIN_CHARS:
+            return "skipped"
+        
+        key = normalize_query(query)
+        with self._lock:
+            self._expire(time.time())
+            
+            entry = self._entries.get(key)
+            if entry:
+                return "cached" if entry.future.done() else "pending"
+            
+            if self._inflight >= self.max_inflight:
+                return "skipped"
+            
+            model = rate_limiter.acquire_spare_model(self.budget_share)
+            if model is None:
+                return "skipped"
+            
+            self._inflight += 1
+            self._entries[key] = _Prefetch(self._executor.submit(self._generate, query, model))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        
+        return "started"
+    
+    def take(self, query: str, timeout: float = PREFETCH_JOIN_TIMEOUT) -> Tuple[Optional[List[str]], int]:
+        """
+        Claim the prefetched search queries of a query, waiting for a matching prefetch that is still running
+        
+        Args:
+            query (str): The submitted query
+            timeout (float): Seconds to wait for a running prefetch
+        
+        Returns:
+            Tuple[Optional[List[str]], int]: The generated queries, or None to generate them now,
+                and the tokens the prefetch used
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.pop(key, None)
+        
+        queries, tokens = None, 0
+        if entry:
+            try:
+                queries, tokens = entry.future.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.info(f"Prefetch for '{query}' did not finish in time")
+        
+        CACHE_REQUESTS.inc(cache="prefetch", result="hit" if queries else "miss")
+        return queries, tokens
+    
+    def _expire(self, now: float) -> None:
+        """Drop prefetches older than the TTL. Must be called with the lock held."""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.created_at <= self.ttl:
+                break
+            del self._entries[key]
+            CACHE_REQUESTS.inc(cache="prefetch", result="expired")
+    
+    def _generate(self, query: str, model: str) -> Tuple[Optional[List[str]], int]:
+        """Generate search queries the same way the research agent does, returning them with the tokens used"""
+        tokens = 0
+        try:
+            response = generate_text(
+                model=model,
+                prompt=search_queries_prompt(query),
+                system_prompt="You are a research assistant helping with deep analysis.",
+                temperature=0.3
+            )
+            
+            if response and 'usage' in response and 'total_tokens' in response['usage']:
+                tokens = response['usage']['total_tokens']
+                rate_limiter.update_rate_limits(model, "tokens", tokens)
+            
+            if response and 'choices' in response:
+                queries = GroqClient.extract_json_from_text(response['choices'][0]['message']['content'])
+                if queries and isinstance(queries, list):
+                    logger.info(f"Prefetched {len(queries)} search queries for '{query}'")
+                    return queries, tokens
+            
+            return None, tokens
+        except Exception as e:
+            logger.warning(f"Error prefetching search queries: {str(e)}")
+            return None, tokens
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+# Prefetcher shared by the prefetch endpoint and the research agents
+query_prefetcher = QueryPrefetcher()
@@ -1,6 +1,7 @@
 import logging
 import uuid
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from typing import Dict, List, Any, Optional, TypedDict, Annotated, Callable
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -9,15 +10,40 @@ from langchain_core.output_parsers import StrOutputParser
 from langgraph.graph import StateGraph
 from langgraph.constants import END
 from utils.api_clients import TavilyClient, GroqClient
-from utils.rate_limiter import RateLimiter
+from utils.async_clients import AsyncTavilyClient, LoopClosed, generate_text, loop_bound, submit
+from utils.rate_limiter import rate_limiter
+from utils.cancellation import CancellationToken, ResearchCancelled
+from utils.dedup import canonicalize_url, shingles, dedupe_queries, NearDuplicateIndex
+from utils.reranker import rerank_references
+from utils.metrics import timed_stage
+from utils.tracing import Trace, activate, deactivate, record_span, traced, propagate
 from models.database import store_research_data, update_chat
 from agents.drafting_agent import DraftingAgent
+from agents.query_prefetch import query_prefetcher, search_queries_prompt
+from config import (
+    NEAR_DUPLICATE_THRESHOLD,
+    RERANK_ENABLED,
+    RERANK_TOP_N,
+    RERANK_TAVILY_WEIGHT,
+    ITERATIVE_RESEARCH,
+    MAX_RESEARCH_ROUNDS,
+    MAX_TOTAL_SEARCHES,
+    MAX_RESEARCH_TOKENS,
+    DRAFTING_TOKEN_RESERVE,
+    NOVELTY_THRESHOLD,
+    FOLLOW_UP_QUERIES,
+    QUERY_SIMILARITY_THRESHOLD,
+    SEARCH_CONCURRENCY,
+    PROGRESSIVE_DRAFTING,
+    PROGRESSIVE_DRAFT_FRACTION,
+    PROGRESSIVE_DRAFT_DEADLINE,
+    LATE_RESULTS_POLICY,
+    LATE_RESULTS_GRACE,
+    QUERY_PREFETCH
+)
 
 logger = logging.getLogger(__name__)
 
-# Initialize rate limiter
-rate_limiter = RateLimiter()
-
 # Define state type for type checking
 class ResearchState(TypedDict):
     query: str
@@ -26,6 +52,15 @@ class ResearchState(TypedDict):
     research_data: List[Any]
     progress: int
     error: Optional[str]
+    searched_count: int
+    research_rounds: List[Dict[str, Any]]
+    tokens_used: int
+    stop_reason: Optional[str]
+    collapsed_queries: List[Dict[str, Any]]
+
+def _stage(name: str, function: Callable) -> Callable:
+    """Record a pipeline stage in the stage latency metrics and the research trace"""
+    return timed_stage(name, traced(name, function))
 
 class ResearchAgent:
     """Research agent using LangGraph for workflow management"""
@@ -50,6 +85,17 @@ class ResearchAgent:
         self.research_data = []
         self.is_researching = False
         self._stop_requested = False
+        self.error = None
+        self.cancel_token = CancellationToken()
+        
+        # Span timeline of the research, starting when it is queued
+        self.trace = Trace(chat_id)
+        
+        # Collected content across search rounds, for deduplication and novelty
+        self._seen_urls = set()
+        self._content_index = NearDuplicateIndex(threshold=NEAR_DUPLICATE_THRESHOLD)
+        self._collected_shingles = set()
+        self._late_searches = []
         
         # Create the research workflow
         self.workflow = self._create_workflow()
@@ -58,7 +104,10 @@ class ResearchAgent:
         """Start the research process"""
         self.is_researching = True
         self._stop_requested = False
+        self.error = None
         self.progress = 5
+        trace_token = activate(self.trace)
+        record_span("queued", 0, self.trace.offset())
         self._update_progress("Starting research process...")
         
         # Initial state
@@ -68,7 +117,12 @@ class ResearchAgent:
             "references": [],
             "research_data": [],
             "progress": 5,
-            "error": None
+            "error": None,
+            "searched_count": 0,
+            "research_rounds": [],
+            "tokens_used": 0,
+            "stop_reason": None,
+            "collapsed_queries": []
         }
         
         # Execute the workflow
@@ -106,6 +160,7 @@ class ResearchAgent:
                     self._update_progress(f"Research progress: {self.progress}%")
             
                 if "error" in state and state["error"]:
+                    self.error = state["error"]
                     self._update_progress(f"Error: {state['error']}")
                     return
             
@@ -113,15 +168,23 @@ class ResearchAgent:
             if not self._stop_requested:
                 self.is_researching = False
                 
+        except ResearchCancelled:
+            self.is_researching = False
+            self._update_progress("Research stopped")
         except Exception as e:
             logger.error(f"Error in research workflow: {str(e)}")
+            self.error = str(e)
             self._update_progress(f"Research failed: {str(e)}")
             self.is_researching = False
+        finally:
+            deactivate(trace_token)
+            update_chat(self.chat_id, {"trace": self.trace.to_dict()})
     
     def stop_research(self):
-        """Stop the research process"""
+        """Stop the research process and abort any in-flight API calls"""
         self._stop_requested = True
         self.is_researching = False
+        self.cancel_token.cancel()
         self._update_progress("Stopping research...")
 
     def _create_workflow(self) -> StateGraph:
@@ -130,9 +193,11 @@ class ResearchAgent:
         workflow = StateGraph(ResearchState)
         
         # Add nodes to the workflow
-        workflow.add_node("generate_queries", self._generate_search_queries)
-        workflow.add_node("execute_searches", self._execute_searches)
-        workflow.add_node("process_results", self._process_results)
+        workflow.add_node("generate_queries", _stage("generate_queries", self._generate_search_queries))
+        workflow.add_node("execute_searches", _stage("execute_searches", self._execute_searches))
+        workflow.add_node("generate_follow_up_queries", _stage("generate_follow_up_queries", self._generate_follow_up_queries))
+        workflow.add_node("rerank_results", _stage("rerank_results", self._rerank_results))
+        workflow.add_node("process_results", _stage("process_results", self._process_results))
         
         # Define conditional routing based on error state
         def should_continue(state: ResearchState) -> str:
@@ -148,15 +213,37 @@ class ResearchAgent:
             }
         )
         
+        # Search again while iterative research keeps finding new content
+        def after_searches(state: ResearchState) -> str:
+            if state.get("error") is not None:
+                return "error"
+            if ITERATIVE_RESEARCH and state.get("stop_reason") is None:
+                return "deepen"
+            return "continue"
+        
+        def after_follow_up(state: ResearchState) -> str:
+            return "search" if state["searched_count"] < len(state["search_queries"]) else "continue"
+        
         workflow.add_conditional_edges(
             "execute_searches",
-            should_continue,
+            after_searches,
             {
-                "continue": "process_results",
+                "deepen": "generate_follow_up_queries",
+                "continue": "rerank_results",
                 "error": END
             }
         )
         
+        workflow.add_conditional_edges(
+            "generate_follow_up_queries",
+            after_follow_up,
+            {
+                "search": "execute_searches",
+                "continue": "rerank_results"
+            }
+        )
+        
+        workflow.add_edge("rerank_results", "process_results")
         workflow.add_edge("process_results", END)
         
         # Set the entry point
@@ -169,30 +256,36 @@ class ResearchAgent:
         """Generate search queries for the research topic"""
         self._update_progress("Generating search queries...")
         
+        # Queries generated while the user was still typing
+        prefetched, prefetch_tokens = query_prefetcher.take(state['query']) if QUERY_PREFETCH else (None, 0)
+        # A prefetch claimed by this research spent its tokens on it
+        state["tokens_used"] += prefetch_tokens
+        if prefetched:
+            logger.info(f"Using {len(prefetched)} prefetched search queries for chat {self.chat_id}")
+            state["search_queries"] = self._merge_similar_queries(state, prefetched) or [state["query"]]
+            state["progress"] = 20
+            return state
+        
         # Get an available model
         model = rate_limiter.get_available_model()
         
-        prompt = f"""
-        Generate 5 specific search queries to thoroughly research the following topic:
-        
-        {state['query']}
-        
-        Format the queries as a JSON array of strings.
-        """
+        prompt = search_queries_prompt(state['query'])
         
         try:
             # Call Groq API
-            response = GroqClient.generate_text(
+            response = generate_text(
                 model=model,
                 prompt=prompt,
                 system_prompt="You are a research assistant helping with deep analysis.",
-                temperature=0.3
+                temperature=0.3,
+                cancel_token=self.cancel_token
             )
             
             # Update rate limits
             rate_limiter.update_rate_limits(model, "request")
             if response and 'usage' in response and 'total_tokens' in response['usage']:
                 rate_limiter.update_rate_limits(model, "tokens", response['usage']['total_tokens'])
+                state["tokens_used"] += response['usage']['total_tokens']
             
             # Extract queries from response
             if response and 'choices' in response:
@@ -200,7 +293,7 @@ class ResearchAgent:
                 queries = GroqClient.extract_json_from_text(content)
                 
                 if queries and isinstance(queries, list):
-                    state["search_queries"] = queries
+                    state["search_queries"] = self._merge_similar_queries(state, queries) or [state["query"]]
                     state["progress"] = 20
                 else:
                     # Fallback if JSON extraction failed
@@ -212,6 +305,8 @@ class ResearchAgent:
                 state["progress"] = 10
                 state["error"] = "Failed to generate search queries"
         
+        except ResearchCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error generating search queries: {str(e)}")
             state["search_queries"] = [state["query"]]
@@ -220,68 +315,282 @@ class ResearchAgent:
         
         return state
     
+    def _merge_similar_queries(self, state: ResearchState, queries: List[Any], existing: Optional[List[str]] = None) -> List[str]:
+        """Drop generated queries that paraphrase another one, recording what was collapsed"""
+        kept, collapsed = dedupe_queries(queries, QUERY_SIMILARITY_THRESHOLD, existing=existing)
+        
+        if collapsed:
+            logger.info(f"Collapsed {len(collapsed)} similar search queries for chat {self.chat_id}")
+            state["collapsed_queries"] = state["collapsed_queries"] + collapsed
+        
+        return kept
+    
+    def _collect_results(self, search_results: Dict[str, Any], all_results: List[Any], references: List[Dict[str, Any]], round_shingles: set) -> int:
+        """
+        Add search results as references, skipping the same page under another URL and near-duplicate content
+        
+        Returns:
+            int: Number of duplicate results skipped
+        """
+        duplicates = 0
+        
+        for result in search_results['results']:
+            reference = {
+                'title': result.get('title', 'No Title'),
+                'url': result.get('url', '#'),
+                'content': result.get('content', ''),
+                'score': result.get('score', 0)
+            }
+        
+            url_key = canonicalize_url(reference['url'])
+            if url_key and url_key in self._seen_urls:
+                duplicates += 1
+                continue
+            
+            if self._content_index.add(url_key or str(len(all_results)), reference['content']):
+                duplicates += 1
+                continue
+            
+            if url_key:
+                self._seen_urls.add(url_key)
+            round_shingles |= shingles(reference['content'])
+            all_results.append(result)
+            references.append(reference)
+        
+        return duplicates
+    
+    def _store_results(self, results: List[Any]) -> None:
+        """Store search results in ChromaDB"""
+        if results:
+            texts = [r.get('content', '') for r in results]
+            metadatas = [{'title': r.get('title', ''), 'url': r.get('url', '')} for r in results]
+            ids = [str(uuid.uuid4()) for _ in range(len(results))]
+        
+            store_research_data(texts, metadatas, ids)
+    
     def _execute_searches(self, state: ResearchState) -> ResearchState:
-        """Execute searches using the generated queries"""
+        """
+        Execute the searches of the current round that have not run yet.
+        
+        In progressive mode the searches run concurrently and the node returns as soon as PROGRESSIVE_DRAFT_FRACTION of the
+        searches have finished or PROGRESSIVE_DRAFT_DEADLINE has passed, provided there is
+        at least one reference; the remaining searches are handled after drafting.
+        """
         self._update_progress("Executing searches...")
     
-        all_results = []
-        references = []
-        total_queries = len(state["search_queries"])
+        all_results = list(state["research_data"])
+        references = list(state["references"])
+        round_queries = state["search_queries"][state["searched_count"]:]
+        total_queries = len(round_queries)
         search_failures = 0
-    
-        for i, query in enumerate(state["search_queries"]):
-            self._update_progress(f"Searching for: {query}")
+        duplicates = 0
+        completed = 0
+        round_shingles = set()
+        start_progress = state["progress"]
+        end_progress = 70 if not ITERATIVE_RESEARCH else start_progress + (70 - start_progress) // 2
+        # A follow-up round is planned from all of a round's results, so iterative research never drafts early
+        progressive = PROGRESSIVE_DRAFTING and not ITERATIVE_RESEARCH
+        deadline = time.time() + PROGRESSIVE_DRAFT_DEADLINE
         
-            try:
-                # Call Tavily API
-                search_results = TavilyClient.search(query)
+        # With progressive drafting all searches start at once; otherwise they run one after another
+        window = len(round_queries) if progressive else 1
+        executor = None
+        queued = list(round_queries)
+        futures = {}
+        pending = set()
+        try:
+            while queued or pending:
+                while queued and len(pending) < window:
+                    query = queued.pop(0)
+                    self._update_progress(f"Searching for: {query}")
+                    # Each search has its own token so a late search can be abandoned on its own
+                    search_token = self.cancel_token.child()
+                    future = None
+                    if loop_bound():
+                        # ASGI mode: the search runs on the server's event loop instead of a thread
+                        try:
+                            future = submit(AsyncTavilyClient.search, query, cancel_token=search_token)
+                        except LoopClosed:
+                            pass
+                    if future is None:
+                        if executor is None:
+                            executor = ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY if progressive else 1, thread_name_prefix="search")
+                        future = executor.submit(propagate(TavilyClient.search), query, cancel_token=search_token)
+                    futures[future] = (query, search_token)
+                    pending.add(future)
+                
+                self.cancel_token.raise_if_cancelled()
+                
+                timeout = None
+                if progressive and (references or time.time() < deadline):
+                    timeout = max(deadline - time.time(), 0)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
             
-                if search_results and 'results' in search_results and search_results['results']:
-                    all_results.extend(search_results['results'])
+                for future in done:
+                    query, _ = futures[future]
+                    completed += 1
+                    try:
+                        search_results = future.result()
+                    
+                        if search_results and 'results' in search_results and search_results['results']:
+                            duplicates += self._collect_results(search_results, all_results, references, round_shingles)
+                        elif 'error' in search_results:
+                            logger.warning(f"Search error for query '{query}': {search_results.get('error')}")
+                            search_failures += 1
                 
-                    # Store references
-                    for result in search_results['results']:
-                        reference = {
-                            'title': result.get('title', 'No Title'),
-                            'url': result.get('url', '#'),
-                            'content': result.get('content', ''),
-                            'score': result.get('score', 0)
-                        }
+                        # Update progress
+                        state["progress"] = min(start_progress + int(completed * (end_progress - start_progress) / total_queries), 70)
+                        self._update_progress(f"Completed search {completed}/{total_queries}")
                     
-                        # Check if reference already exists
-                        if not any(ref['url'] == reference['url'] for ref in references):
-                            references.append(reference)
-                elif 'error' in search_results:
-                    logger.warning(f"Search error for query '{query}': {search_results.get('error')}")
-                    search_failures += 1
-        
-                # Update progress
-                progress_increment = 50 / total_queries
-                state["progress"] = min(20 + int((i + 1) * progress_increment), 70)
-                self._update_progress(f"Completed search {i+1}/{total_queries}")
-            
-            except Exception as e:
-                logger.error(f"Error executing search for query '{query}': {str(e)}")
-                self._update_progress(f"Error in search: {str(e)}")
-                search_failures += 1
+                    except ResearchCancelled:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error executing search for query '{query}': {str(e)}")
+                        self._update_progress(f"Error in search: {str(e)}")
+                        search_failures += 1
+                
+                # Start drafting early once enough searches are in or the deadline has passed
+                if progressive and pending and references and (
+                    completed >= PROGRESSIVE_DRAFT_FRACTION * total_queries or time.time() >= deadline
+                ):
+                    self._late_searches = [(futures[future][0], future, futures[future][1]) for future in pending]
+                    self._update_progress(f"Drafting with {completed}/{total_queries} searches completed")
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+    
+        if duplicates:
+            logger.info(f"Skipped {duplicates} duplicate search results for chat {self.chat_id}")
     
         # Check if all searches failed
-        if search_failures == total_queries:
+        if search_failures == total_queries and not references:
             state["error"] = "All search queries failed. Please check your Tavily API key and try again."
             return state
     
         # Store research data in ChromaDB
-        if all_results:
-            texts = [r.get('content', '') for r in all_results]
-            metadatas = [{'title': r.get('title', ''), 'url': r.get('url', '')} for r in all_results]
-            ids = [str(uuid.uuid4()) for _ in range(len(all_results))]
-        
-            store_research_data(texts, metadatas, ids)
+        self._store_results(all_results[len(state["research_data"]):])
     
+        # Share of this round's content that was not already collected. The first round
+        # has nothing to compare against, so novelty is only measured from round 2 on.
+        novelty = None
+        if state["research_rounds"]:
+            novelty = len(round_shingles - self._collected_shingles) / len(round_shingles) if round_shingles else 0.0
+        self._collected_shingles |= round_shingles
+        
+        state["research_rounds"] = state["research_rounds"] + [{
+            "round": len(state["research_rounds"]) + 1,
+            "queries": round_queries,
+            "new_references": len(references) - len(state["references"]),
+            "novelty": round(novelty, 3) if novelty is not None else None
+        }]
+        state["searched_count"] = len(state["search_queries"])
         state["research_data"] = all_results
         state["references"] = references
-        state["progress"] = 70
+        state["progress"] = end_progress
+        
+        if ITERATIVE_RESEARCH:
+            state["stop_reason"] = self._deepening_stop_reason(state, novelty)
+            if state["stop_reason"] is None and novelty is None:
+                self._update_progress(f"Round {len(state['research_rounds'])} completed, searching deeper...")
+            elif state["stop_reason"] is None:
+                self._update_progress(f"Round {len(state['research_rounds'])} added {novelty:.0%} new content, searching deeper...")
+            else:
+                state["progress"] = 70
+    
+        return state
+    
+    def _deepening_stop_reason(self, state: ResearchState, novelty: Optional[float]) -> Optional[str]:
+        """Return why iterative research should stop after this round, or None to continue"""
+        if len(state["research_rounds"]) >= MAX_RESEARCH_ROUNDS:
+            return "max_rounds"
+        if state["searched_count"] >= MAX_TOTAL_SEARCHES:
+            return "max_searches"
+        # Another round must leave enough of the token budget for drafting
+        if state["tokens_used"] + DRAFTING_TOKEN_RESERVE >= MAX_RESEARCH_TOKENS:
+            return "max_tokens"
+        if novelty is not None and novelty < NOVELTY_THRESHOLD:
+            return "low_novelty"
+        return None
     
+    def _generate_follow_up_queries(self, state: ResearchState) -> ResearchState:
+        """Generate follow-up search queries that target what the collected results do not cover"""
+        self._update_progress("Generating follow-up search queries...")
+        
+        model = rate_limiter.get_available_model()
+        query_count = min(FOLLOW_UP_QUERIES, MAX_TOTAL_SEARCHES - state["searched_count"])
+        searched = "\n".join(f"- {query}" for query in state["search_queries"])
+        titles = "\n".join(f"- {ref['title']}" for ref in state["references"][:20])
+        
+        prompt = f"""
+        We are researching the following topic:
+        
+        {state['query']}
+        
+        These searches have already been run:
+        {searched}
+        
+        They found sources with these titles:
+        {titles}
+        
+        Generate {query_count} new, specific search queries that cover important aspects of the topic
+        that the sources above do not address. Do not repeat or paraphrase the searches already run.
+        
+        Format the queries as a JSON array of strings.
+        """
+        
+        try:
+            response = generate_text(
+                model=model,
+                prompt=prompt,
+                system_prompt="You are a research assistant helping with deep analysis.",
+                temperature=0.3,
+                cancel_token=self.cancel_token
+            )
+            
+            # Update rate limits
+            rate_limiter.update_rate_limits(model, "request")
+            if response and 'usage' in response and 'total_tokens' in response['usage']:
+                rate_limiter.update_rate_limits(model, "tokens", response['usage']['total_tokens'])
+                state["tokens_used"] += response['usage']['total_tokens']
+            
+            queries = None
+            if response and 'choices' in response:
+                queries = GroqClient.extract_json_from_text(response['choices'][0]['message']['content'])
+            
+            new_queries = []
+            if queries and isinstance(queries, list):
+                new_queries = self._merge_similar_queries(state, queries, existing=state["search_queries"])[:query_count]
+            
+            if new_queries:
+                state["search_queries"] = state["search_queries"] + new_queries
+                self.search_queries = state["search_queries"]
+                self._emit_search_queries()
+            else:
+                state["stop_reason"] = "no_follow_up_queries"
+        
+        except ResearchCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating follow-up queries: {str(e)}")
+            state["stop_reason"] = "no_follow_up_queries"
+        
+        return state
+    
+    def _rerank_results(self, state: ResearchState) -> ResearchState:
+        """Keep the references most relevant to the original query"""
+        if not RERANK_ENABLED or len(state["references"]) <= 1:
+            return state
+        
+        self._update_progress("Ranking search results...")
+        state["references"] = rerank_references(
+            state["query"],
+            state["references"],
+            top_n=RERANK_TOP_N,
+            tavily_weight=RERANK_TAVILY_WEIGHT
+        )
+        self.references = state["references"]
+        
         return state
     
     def _process_results(self, state: ResearchState) -> ResearchState:
@@ -292,7 +601,10 @@ class ResearchAgent:
         update_chat(self.chat_id, {
             "references": state["references"],
             "search_queries": state["search_queries"],
-            "research_data": state["research_data"]
+            "research_data": state["research_data"],
+            "research_rounds": state["research_rounds"],
+            "research_stop_reason": state["stop_reason"],
+            "collapsed_queries": state["collapsed_queries"]
         })
         
         # Store the references in the agent for the drafting agent
@@ -304,8 +616,25 @@ class ResearchAgent:
             if self.status_callback:
                 self.status_callback(progress, message, search_queries, references, analysis)
         
-        drafting_agent = DraftingAgent(self.chat_id, status_callback=drafting_callback)
-        analysis = drafting_agent.generate_analysis(state["query"], state["references"])
+        self.cancel_token.raise_if_cancelled()
+        drafting_agent = DraftingAgent(self.chat_id, status_callback=drafting_callback, cancel_token=self.cancel_token)
+        generate_analysis = _stage("drafting", drafting_agent.generate_analysis)
+        
+        if self._late_searches:
+            # Searches are still running: draft now and publish once late results are handled
+            try:
+                analysis = generate_analysis(state["query"], state["references"], publish=False)
+                if drafting_agent.pending_analysis:
+                    analysis = drafting_agent.publish_analysis(self._handle_late_results(state, drafting_agent, analysis))
+            finally:
+                # Also when drafting failed or was cancelled, so no late search outlives the job
+                self._cancel_late_searches()
+        else:
+            analysis = generate_analysis(state["query"], state["references"])
+        
+        # Total LLM usage of the research: query generation and drafting
+        state["tokens_used"] += drafting_agent.tokens_used
+        update_chat(self.chat_id, {"tokens_used": state["tokens_used"]})
         
         if analysis:
             # Update progress after analysis is complete
@@ -316,6 +645,71 @@ class ResearchAgent:
         
         return state
     
+    def _handle_late_results(self, state: ResearchState, drafting_agent: DraftingAgent, analysis: str) -> str:
+        """
+        Apply LATE_RESULTS_POLICY to the searches that were still running when drafting started
+        
+        Args:
+            state (ResearchState): The workflow state
+            drafting_agent (DraftingAgent): The agent that drafted the analysis
+            analysis (str): The drafted analysis
+        
+        Returns:
+            str: The analysis to publish
+        """
+        late_searches = self._late_searches
+        summary = {"policy": LATE_RESULTS_POLICY, "late_searches": len(late_searches), "new_references": 0, "refined": False}
+        
+        if LATE_RESULTS_POLICY != "refine":
+            # The caller cancels the late searches
+            update_chat(self.chat_id, {"late_results": summary})
+            return analysis
+        
+        self._update_progress("Waiting for remaining searches...")
+        done, _ = wait([future for _, future, _ in late_searches], timeout=LATE_RESULTS_GRACE)
+        
+        all_results = list(state["research_data"])
+        references = list(state["references"])
+        for query, future, search_token in late_searches:
+            if future not in done:
+                logger.warning(f"Dropping search '{query}' that did not finish in time")
+                continue
+            try:
+                search_results = future.result()
+            except ResearchCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Error executing search for query '{query}': {str(e)}")
+                continue
+            if search_results and search_results.get('results'):
+                self._collect_results(search_results, all_results, references, set())
+        
+        new_indices = list(range(len(state["references"]), len(references)))
+        summary["new_references"] = len(new_indices)
+        
+        if new_indices:
+            self._store_results(all_results[len(state["research_data"]):])
+            state["references"] = references
+            state["research_data"] = all_results
+            self.references = references
+            self.research_data = all_results
+            update_chat(self.chat_id, {"references": references, "research_data": all_results})
+            
+            refined = drafting_agent.refine_analysis(state["query"], analysis, references, new_indices)
+            if refined:
+                analysis = refined
+                summary["refined"] = True
+        
+        update_chat(self.chat_id, {"late_results": summary})
+        return analysis
+    
+    def _cancel_late_searches(self) -> None:
+        """Cancel the searches still running after drafting started and forget them"""
+        late_searches, self._late_searches = self._late_searches, []
+        for _, future, search_token in late_searches:
+            future.cancel()
+            search_token.cancel()
+    
     def _update_progress(self, message: str, analysis: str = None):
         """Update and emit progress"""
         if self.status_callback:
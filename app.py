@@ -1,28 +1,43 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
 import os
 import uuid
 import threading
 import logging
 import json
+import time
 from datetime import datetime
 
 # Import configuration
-from config import SECRET_KEY
+from config import SECRET_KEY, MAX_BATCH_SIZE, BATCH_RETENTION, ITERATIVE_RESEARCH, PROGRESSIVE_DRAFTING, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, QUERY_PREFETCH
 
 # Import database models
 from models.database import (
     get_chat, 
-    get_all_chats, 
+    get_trace_document,
+    get_chat_version,
+    get_chats_version,
+    iter_chats,
+    search_chats,
     create_chat, 
     update_chat, 
     get_settings, 
-    update_settings
+    update_settings,
+    CHAT_LIST_FIELDS
 )
 
 # Import agents
 from agents.research_agent import ResearchAgent
 from agents.drafting_agent import DraftingAgent
+from agents.query_prefetch import query_prefetcher
+
+# Import utilities
+from utils.text_utils import normalize_query, highlight
+from utils.scheduler import ResearchScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from utils.export import gzip_jsonl
+from utils.fast_json import FastJSONProvider
+from utils.http_cache import make_etag, is_not_modified, not_modified, cached_json, streamed_json, compress_response
+from utils.metrics import REGISTRY, QUEUE_DEPTH, ACTIVE_JOBS, RESEARCH_JOBS, CACHE_REQUESTS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -31,8 +46,12 @@ logger = logging.getLogger(__name__)
 # Reduce logging verbosity
 logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
+if PROGRESSIVE_DRAFTING and ITERATIVE_RESEARCH:
+    logger.warning("PROGRESSIVE_DRAFTING has no effect with ITERATIVE_RESEARCH; searches run one after another")
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)  # Enable CORS
 app.config['SECRET_KEY'] = SECRET_KEY
 
@@ -40,6 +59,58 @@ app.config['SECRET_KEY'] = SECRET_KEY
 active_agents = {}
 active_threads = {}
 research_status = {}
+research_batches = {}
+
+# Scheduler that runs research jobs within the model rate budgets
+research_scheduler = ResearchScheduler()
+
+def _collect_scheduler_metrics():
+    """Set the scheduler gauges from one snapshot per scrape"""
+    stats = research_scheduler.stats()
+    QUEUE_DEPTH.set(stats["queued_batch"], priority=PRIORITY_BATCH)
+    ACTIVE_JOBS.set(stats["running"])
+
+REGISTRY.add_collector(_collect_scheduler_metrics)
+
+# In-flight research keyed by normalized query, used to coalesce identical requests,
+# and the IDs of the requesters following each research
+inflight_queries = {}
+research_subscribers = {}
+inflight_lock = threading.Lock()
+
+def _find_inflight_chat(query_key):
+    """Return the chat ID of an unfinished research for the query key, if any"""
+    chat_id = inflight_queries.get(query_key)
+    if not chat_id or chat_id not in research_status:
+        return None
+    
+    status = research_status[chat_id]
+    if status.get("completed") or status.get("error"):
+        return None
+    
+    return chat_id
+
+def _expire_batches(now):
+    """Mark batches whose jobs have all finished, and forget those finished longer than BATCH_RETENTION ago"""
+    for batch_id, batch in list(research_batches.items()):
+        if batch.get("finished_at") is None:
+            if batch["jobs"] and all(_research_state(job["chat_id"]) in ("completed", "failed", "stopped") for job in batch["jobs"]):
+                batch["finished_at"] = now
+        elif now - batch["finished_at"] > BATCH_RETENTION:
+            research_batches.pop(batch_id, None)
+
+def _release_inflight(chat_id):
+    """Forget the in-flight entry and subscribers of a finished research"""
+    with inflight_lock:
+        for query_key, inflight_chat_id in list(inflight_queries.items()):
+            if inflight_chat_id == chat_id:
+                del inflight_queries[query_key]
+        research_subscribers.pop(chat_id, None)
+
+@app.after_request
+def compress(response):
+    """Compress large responses for clients that accept gzip or brotli"""
+    return compress_response(response)
 
 # Routes
 @app.route('/')
@@ -48,25 +119,107 @@ def index():
 
 @app.route('/api/chats', methods=['GET'])
 def get_chats():
-    chats = get_all_chats()
-    
-    # Convert ObjectId to string for JSON serialization
-    for chat in chats:
-        chat['_id'] = str(chat['_id'])
-    
-    return jsonify(chats)
+    # Answer an unchanged list from its version, otherwise stream it from the cursor
+    etag = make_etag("chats", *get_chats_version())
+    return streamed_json(iter_chats(newest_first=True, projection=CHAT_LIST_FIELDS), etag)
+
+def _chat_etag(chat_id, representation):
+    """ETag of a stored chat's representation, or None if the chat does not exist"""
+    version = get_chat_version(chat_id)
+    if version is None:
+        return None
+    return make_etag(representation, chat_id, version)
 
 @app.route('/api/chat/<chat_id>', methods=['GET'])
 def get_chat_by_id(chat_id):
+    # Answer unchanged chats from their version without loading them
+    etag = _chat_etag(chat_id, "chat")
+    if etag and is_not_modified(etag):
+        return not_modified(etag)
+    
     chat = get_chat(chat_id)
     
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
+
+    return cached_json(chat, etag)
+
+@app.route('/api/chat/<chat_id>/trace', methods=['GET'])
+def get_chat_trace(chat_id):
+    """Span timeline of a research, live while it runs and from the chat once it has finished"""
+    agent = active_agents.get(chat_id)
+    if agent:
+        return jsonify(agent.trace.to_dict())
+
+    chat = get_trace_document(chat_id)
+    if not chat:
+        return jsonify({"error": "Chat not found"}), 404
+    if not chat.get('trace'):
+        return jsonify({"error": "No trace recorded for this chat"}), 404
+
+    return jsonify(chat['trace'])
+
+@app.route('/api/search', methods=['GET'])
+def search_research():
+    """Ranked, paginated full-text search over past research, with highlighted matches"""
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"error": "No search query provided"}), 400
     
-    # Convert ObjectId to string for JSON serialization
-    chat['_id'] = str(chat['_id'])
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
     
-    return jsonify(chat)
+    chats, total = search_chats(text, skip=(page - 1) * per_page, limit=per_page)
+    
+    return jsonify(_search_payload(text, page, per_page, chats, total))
+
+def _search_payload(text, page, per_page, chats, total):
+    """Search response with highlighted matches, shared with the ASGI app"""
+    results = []
+    for chat in chats:
+        titles = [ref.get('title', '') for ref in chat.get('references', [])]
+        results.append({
+            "chat_id": str(chat['_id']),
+            "query": chat.get('query', ''),
+            "status": chat.get('status'),
+            "created_at": chat.get('created_at'),
+            "score": round(chat.get('score', 0), 4),
+            "highlights": {
+                "query": highlight(chat.get('query', ''), text, max_snippets=1, width=len(chat.get('query', '')) or 1),
+                "analysis": highlight(chat.get('analysis', ''), text),
+                "references": [snippet for title in titles for snippet in highlight(title, text, max_snippets=1)][:3]
+            }
+        })
+    
+    return {
+        "query": text,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": (total + per_page - 1) // per_page,
+        "results": results
+    }
+
+@app.route('/api/export', methods=['GET'])
+def export_chats():
+    """Stream chats as gzip-compressed JSON lines, filtered by ?since=, ?until= (ISO dates) and ?status="""
+    try:
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO 8601 dates"}), 400
+    
+    chats = iter_chats(since=since, until=until, status=request.args.get('status'))
+    filename = f"chats-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+    
+    return Response(
+        stream_with_context(gzip_jsonl(chats)),
+        mimetype='application/gzip',
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 @app.route('/api/settings', methods=['GET'])
 def get_app_settings():
@@ -86,30 +239,57 @@ def update_app_settings():
     updated_settings = update_settings(new_settings)
     return jsonify(updated_settings)
 
-@app.route('/api/research/start', methods=['POST'])
-def start_research():
-    data = request.json
-    query = data.get('query')
+def _launch_research(query, force_refresh=False, priority=PRIORITY_INTERACTIVE, batch_id=None):
+    """
+    Create a chat for the query and queue its research on the scheduler
     
-    if not query:
-        return jsonify({"error": "No query provided"}), 400
+    Args:
+        query (str): The research query
+        force_refresh (bool): Start a new research even if an identical one is running
+        priority (str): Scheduler priority of the research
+        batch_id (str, optional): Batch the research belongs to
+    
+    Returns:
+        Tuple[str, bool, str]: The chat ID, whether the request was coalesced, and the
+            subscriber ID the requester passes when stopping the research
+    """
+    query_key = normalize_query(query)
+    subscriber_id = str(uuid.uuid4())
+    
+    with inflight_lock:
+        # Attach to an identical research that is still running
+        if not force_refresh:
+            existing_chat_id = _find_inflight_chat(query_key)
+            if existing_chat_id:
+                # An interactive requester must not wait behind a batch for the research it joins
+                if priority == PRIORITY_INTERACTIVE and research_scheduler.promote(existing_chat_id):
+                    research_status[existing_chat_id]["message"] = "Starting research..."
+                research_subscribers.setdefault(existing_chat_id, set()).add(subscriber_id)
+                logger.info(f"Coalesced research request for '{query}' into chat {existing_chat_id}")
+                CACHE_REQUESTS.inc(cache="coalescing", result="hit")
+                return existing_chat_id, True, subscriber_id
+            CACHE_REQUESTS.inc(cache="coalescing", result="miss")
+        
+        # Create a new chat
+        chat_id = str(uuid.uuid4())
+        inflight_queries[query_key] = chat_id
+        research_subscribers[chat_id] = {subscriber_id}
     
-    # Create a new chat
-    chat_id = str(uuid.uuid4())
+        # Initialize status; batch research waits in the scheduler queue until a worker is free
+        queued = priority == PRIORITY_BATCH
+        research_status[chat_id] = {
+            "progress": 5,
+            "message": "Queued for research..." if queued else "Starting research...",
+            "search_queries": [],
+            "references": [],
+            "analysis": None,
+            "completed": False,
+            "queued": queued
+        }
     
     # Save to MongoDB
     create_chat(chat_id, query)
     
-    # Initialize status
-    research_status[chat_id] = {
-        "progress": 5,
-        "message": "Starting research...",
-        "search_queries": [],
-        "references": [],
-        "analysis": None,
-        "completed": False
-    }
-    
     # Create research agent with custom callback
     def status_callback(progress, message, search_queries=None, references=None, analysis=None):
         if chat_id in research_status:
@@ -131,17 +311,18 @@ def start_research():
     research_agent = ResearchAgent(query, chat_id, status_callback=status_callback)
     active_agents[chat_id] = research_agent
     
-    # Start research in a separate thread
+    # Run research on a scheduler worker thread
     def research_workflow():
+        active_threads[chat_id] = threading.current_thread()
+        if chat_id in research_status:
+            research_status[chat_id]["queued"] = False
         try:
             # Start the research process
             research_agent.start_research()
             
-            # Clean up
-            if chat_id in active_agents:
-                del active_agents[chat_id]
-            if chat_id in active_threads:
-                del active_threads[chat_id]
+            # The agent reports pipeline errors itself instead of raising them
+            if research_agent.error and chat_id in research_status:
+                research_status[chat_id]["error"] = research_agent.error
         
         except Exception as e:
             logger.error(f"Error in research workflow: {str(e)}")
@@ -149,62 +330,190 @@ def start_research():
                 research_status[chat_id]["error"] = str(e)
                 research_status[chat_id]["message"] = f"Research failed: {str(e)}"
                 research_status[chat_id]["progress"] = 0
-            
-            # Clean up on error
+        
+        finally:
+            # Clean up
             if chat_id in active_agents:
                 del active_agents[chat_id]
             if chat_id in active_threads:
                 del active_threads[chat_id]
+            _release_inflight(chat_id)
+            outcome = _research_state(chat_id)
+            RESEARCH_JOBS.inc(outcome="error" if outcome == "failed" else outcome)
+    
+    research_scheduler.submit(chat_id, research_workflow, priority=priority, group=batch_id)
+    
+    return chat_id, False, subscriber_id
+
+def _research_state(chat_id):
+    """Classify a research as queued, running, completed, failed or stopped"""
+    status = research_status.get(chat_id, {})
+    if status.get("completed"):
+        return "completed"
+    if status.get("error"):
+        return "failed"
+    if research_scheduler.is_queued(chat_id):
+        return "queued"
+    if chat_id in active_agents:
+        return "running"
+    return "stopped"
+
+@app.route('/api/research/start', methods=['POST'])
+def start_research():
+    data = request.json
+    query = data.get('query')
+    force_refresh = bool(data.get('force_refresh', False))
+    
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    
+    chat_id, coalesced, subscriber_id = _launch_research(query, force_refresh=force_refresh)
+    
+    return jsonify({"chat_id": chat_id, "query": query, "coalesced": coalesced, "subscriber_id": subscriber_id})
+
+@app.route('/api/research/prefetch', methods=['POST'])
+def prefetch_research():
+    """Generate search queries for a query that is still being typed, if the models have spare capacity"""
+    if not QUERY_PREFETCH:
+        return jsonify({"status": "disabled"})
     
-    # Start the research thread
-    research_thread = threading.Thread(target=research_workflow)
-    research_thread.daemon = True
-    research_thread.start()
+    data = request.json or {}
+    query = data.get('query', '')
+    if not isinstance(query, str):
+        return jsonify({"error": "query must be a string"}), 400
     
-    # Store the thread
-    active_threads[chat_id] = research_thread
+    # An identical research is already running and a start request would join it
+    with inflight_lock:
+        if _find_inflight_chat(normalize_query(query)):
+            return jsonify({"status": "skipped"})
     
-    return jsonify({"chat_id": chat_id, "query": query})
+    return jsonify({"status": query_prefetcher.prefetch(query)})
+
+@app.route('/api/research/batch', methods=['POST'])
+def start_batch_research():
+    data = request.json or {}
+    queries = [q.strip() for q in data.get('queries', []) if isinstance(q, str) and q.strip()]
+    force_refresh = bool(data.get('force_refresh', False))
+    
+    if not queries:
+        return jsonify({"error": "No queries provided"}), 400
+    
+    if len(queries) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"A batch can contain at most {MAX_BATCH_SIZE} queries"}), 400
+    
+    _expire_batches(time.time())
+    
+    batch_id = str(uuid.uuid4())
+    research_batches[batch_id] = {
+        "created_at": time.time(),
+        "finished_at": None,
+        "jobs": []
+    }
+    
+    for query in queries:
+        chat_id, coalesced, subscriber_id = _launch_research(
+            query,
+            force_refresh=force_refresh,
+            priority=PRIORITY_BATCH,
+            batch_id=batch_id
+        )
+        research_batches[batch_id]["jobs"].append({
+            "chat_id": chat_id,
+            "query": query,
+            "coalesced": coalesced,
+            "subscriber_id": subscriber_id
+        })
+    
+    logger.info(f"Queued batch {batch_id} with {len(queries)} queries")
+    
+    return jsonify({"batch_id": batch_id, "jobs": research_batches[batch_id]["jobs"]})
+
+@app.route('/api/research/batch/<batch_id>', methods=['GET'])
+def get_batch_status(batch_id):
+    _expire_batches(time.time())
+    batch = research_batches.get(batch_id)
+    if not batch:
+        return jsonify({"error": "Batch not found"}), 404
+    
+    jobs = []
+    counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0, "stopped": 0}
+    for job in batch["jobs"]:
+        chat_id = job["chat_id"]
+        state = _research_state(chat_id)
+        counts[state] += 1
+        progress = 100 if state == "completed" else research_status.get(chat_id, {}).get("progress", 0)
+        jobs.append({"chat_id": chat_id, "query": job["query"], "state": state, "progress": progress})
+    
+    total = len(jobs)
+    elapsed = time.time() - batch["created_at"]
+    finished = counts["completed"] + counts["failed"] + counts["stopped"]
+    
+    return jsonify({
+        "batch_id": batch_id,
+        "total": total,
+        "counts": counts,
+        "progress": round(sum(job["progress"] for job in jobs) / total, 1) if total else 0,
+        "finished": finished == total,
+        "elapsed_seconds": round(elapsed, 1),
+        "throughput_per_minute": round(finished / (elapsed / 60), 2) if elapsed > 0 else 0,
+        "jobs": jobs
+    })
 
 @app.route('/api/research/status/<chat_id>', methods=['GET'])
 def get_research_status(chat_id):
     # If chat is in active research, return status
     if chat_id in research_status:
-        return jsonify(research_status[chat_id])
+        return cached_json(research_status[chat_id])
     
     # Otherwise, get chat from database
+    etag = _chat_etag(chat_id, "status")
+    if etag and is_not_modified(etag):
+        return not_modified(etag)
+    
     chat = get_chat(chat_id)
     if not chat:
         return jsonify({"error": "Chat not found"}), 404
     
-    # Convert ObjectId to string for JSON serialization
-    chat_id = str(chat['_id'])
-    
+    return cached_json(_stored_status(chat), etag)
+
+def _stored_status(chat):
+    """Status of a research from its stored chat"""
     # Return completed status
     if chat.get('status') == 'completed':
-        return jsonify({
+        return {
             "progress": 100,
             "message": "Research completed",
             "search_queries": chat.get('search_queries', []),
             "references": chat.get('references', []),
             "analysis": chat.get('analysis', ''),
             "completed": True
-        })
+        }
     
     # Return in-progress status
-    return jsonify({
+    return {
         "progress": 50,
         "message": "Research in progress...",
         "search_queries": chat.get('search_queries', []),
         "references": chat.get('references', []),
         "completed": False
-    })
+    }
 
 @app.route('/api/research/stop/<chat_id>', methods=['POST'])
 def stop_research(chat_id):
     if chat_id in active_agents:
-        # Stop the research agent
+        # Keep a coalesced research running while other requesters still follow it.
+        # Without a subscriber ID the caller is assumed to be one of the subscribers.
+        subscriber_id = (request.get_json(silent=True) or {}).get('subscriber_id')
+        with inflight_lock:
+            subscribers = research_subscribers.get(chat_id, set())
+            subscribers.discard(subscriber_id)
+            others = len(subscribers) if subscriber_id else len(subscribers) - 1
+            if others > 0:
+                return jsonify({"status": "detached", "subscribers": len(subscribers)})
+        
+        # Stop the research agent and drop it from the queue if it has not started
         active_agents[chat_id].stop_research()
+        research_scheduler.cancel(chat_id)
         del active_agents[chat_id]
         
         # Update chat status
@@ -216,6 +525,7 @@ def stop_research(chat_id):
         # Remove thread reference
         if chat_id in active_threads:
             del active_threads[chat_id]
+        _release_inflight(chat_id)
         
         # Update status
         if chat_id in research_status:
@@ -230,6 +540,11 @@ def stop_research(chat_id):
 def health_check():
     return jsonify({"status": "healthy"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/debug', methods=['GET'])
 def debug():
     """Debug endpoint to check if server is responding"""
@@ -238,6 +553,8 @@ def debug():
         "message": "Server is responding correctly",
         "active_agents": list(active_agents.keys()),
         "active_threads": list(active_threads.keys()),
+        "inflight_queries": dict(inflight_queries),
+        "scheduler": research_scheduler.stats(),
         "research_status": {k: v["progress"] for k, v in research_status.items()} if research_status else {}
     })
 
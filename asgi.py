@@ -0,0 +1,193 @@
+"""
+Async (ASGI) entry point serving the same REST API as app.py.
+
+The read endpoints the web UI polls are served by coroutines, with MongoDB
+reached through motor when it is installed, so open status requests do not
+hold a thread each. Every other route is handled by the Flask app. Research
+jobs still run on the scheduler's worker threads, but their Tavily and Groq
+calls run on this server's event loop with httpx, so a job no longer holds
+threads for its concurrent searches and in-flight requests.
+
+Usage:
+    pip install starlette uvicorn httpx motor
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import contextlib
+import logging
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from app import (
+    app as flask_app,
+    research_status,
+    active_agents,
+    _stored_status,
+    _search_payload
+)
+from config import SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, COMPRESSION_MIN_BYTES
+from models import async_database
+from models.database import CHAT_LIST_FIELDS
+from utils.async_clients import bind_loop, unbind_loop
+from utils.fast_json import aiter_json_array
+from utils.http_cache import make_etag, etag_matches, preferred_encoding, compress_body, encoded_etag, agzip_chunks
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+def _json(request: Request, payload, etag: str = None, status_code: int = 200) -> Response:
+    """
+    JSON response serialized like the Flask app's, with the same ETag and compression handling
+
+    Args:
+        request (Request): The request
+        payload: The JSON-serializable payload
+        etag (str, optional): ETag derived from a version; defaults to a hash of the body
+        status_code (int): Response status
+
+    Returns:
+        Response: The response
+    """
+    body = flask_app.json.dumps(payload).encode("utf-8")
+    if status_code != 200:
+        return Response(body, status_code=status_code, media_type="application/json")
+
+    etag = etag or make_etag(body)
+    if etag_matches(parse_etags(request.headers.get("if-none-match")), etag):
+        return _not_modified(etag)
+
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    encoding = preferred_encoding(parse_accept_header(request.headers.get("accept-encoding")))
+    if encoding and len(body) >= COMPRESSION_MIN_BYTES:
+        body = compress_body(body, encoding)
+        headers["Content-Encoding"] = encoding
+        etag = encoded_etag(etag, encoding)
+
+    headers["ETag"] = f'"{etag}"'
+    return Response(body, media_type="application/json", headers=headers)
+
+def _not_modified(etag: str) -> Response:
+    """Empty 304 response for an ETag"""
+    return Response(status_code=304, headers={"ETag": f'"{etag}"', "Cache-Control": "no-cache"})
+
+async def _chat_etag(chat_id: str, representation: str):
+    """ETag of a stored chat's representation, or None if the chat does not exist"""
+    version = await async_database.get_chat_version(chat_id)
+    if version is None:
+        return None
+    return make_etag(representation, chat_id, version)
+
+async def get_chats(request: Request) -> Response:
+    # Answer an unchanged list from its version, otherwise stream it from the cursor
+    etag = make_etag("chats", *await async_database.get_chats_version())
+    if etag_matches(parse_etags(request.headers.get("if-none-match")), etag):
+        return _not_modified(etag)
+
+    chunks = aiter_json_array(async_database.iter_all_chats(projection=CHAT_LIST_FIELDS))
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if parse_accept_header(request.headers.get("accept-encoding"))["gzip"]:
+        chunks = agzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        etag = encoded_etag(etag, "gzip")
+
+    headers["ETag"] = f'"{etag}"'
+    return StreamingResponse(chunks, media_type="application/json", headers=headers)
+
+async def get_chat_by_id(request: Request) -> Response:
+    chat_id = request.path_params["chat_id"]
+    etag = await _chat_etag(chat_id, "chat")
+    if etag and etag_matches(parse_etags(request.headers.get("if-none-match")), etag):
+        return _not_modified(etag)
+
+    chat = await async_database.get_chat(chat_id)
+    if not chat:
+        return _json(request, {"error": "Chat not found"}, status_code=404)
+
+    return _json(request, chat, etag)
+
+async def get_chat_trace(request: Request) -> Response:
+    chat_id = request.path_params["chat_id"]
+    agent = active_agents.get(chat_id)
+    if agent:
+        return _json(request, agent.trace.to_dict())
+
+    chat = await async_database.get_trace_document(chat_id)
+    if not chat:
+        return _json(request, {"error": "Chat not found"}, status_code=404)
+    if not chat.get('trace'):
+        return _json(request, {"error": "No trace recorded for this chat"}, status_code=404)
+
+    return _json(request, chat['trace'])
+
+async def get_research_status(request: Request) -> Response:
+    chat_id = request.path_params["chat_id"]
+    if chat_id in research_status:
+        return _json(request, research_status[chat_id])
+
+    etag = await _chat_etag(chat_id, "status")
+    if etag and etag_matches(parse_etags(request.headers.get("if-none-match")), etag):
+        return _not_modified(etag)
+
+    chat = await async_database.get_chat(chat_id)
+    if not chat:
+        return _json(request, {"error": "Chat not found"}, status_code=404)
+
+    return _json(request, _stored_status(chat), etag)
+
+async def search_research(request: Request) -> Response:
+    text = request.query_params.get('q', '').strip()
+    if not text:
+        return _json(request, {"error": "No search query provided"}, status_code=400)
+
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        per_page = min(max(int(request.query_params.get('per_page', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return _json(request, {"error": "page and per_page must be integers"}, status_code=400)
+
+    chats, total = await async_database.search_chats(text, skip=(page - 1) * per_page, limit=per_page)
+    return _json(request, _search_payload(text, page, per_page, chats, total))
+
+async def health_check(request: Request) -> Response:
+    return _json(request, {"status": "healthy"})
+
+async def metrics(request: Request) -> Response:
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    """Send the external calls of research jobs through this server's event loop while it runs"""
+    bind_loop(asyncio.get_running_loop())
+    try:
+        yield
+    finally:
+        await unbind_loop()
+
+app = Starlette(
+    routes=[
+        Route('/api/chats', get_chats, methods=['GET']),
+        Route('/api/chat/{chat_id}', get_chat_by_id, methods=['GET']),
+        Route('/api/chat/{chat_id}/trace', get_chat_trace, methods=['GET']),
+        Route('/api/research/status/{chat_id}', get_research_status, methods=['GET']),
+        Route('/api/search', search_research, methods=['GET']),
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        # Everything else, including the UI and the routes that start and stop research
+        Mount('/', app=WSGIMiddleware(flask_app))
+    ],
+    lifespan=lifespan
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,135 @@
+"""Helpers shared by the benchmark scripts: running the app, sampling its memory and summarizing latencies"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs the Flask app without the debug reloader, so the process we start is the server itself
+_SERVER_COMMAND = "from app import app; app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"
+
+
+def start_app_server(port: int, env: Optional[Dict[str, str]] = None, command: Optional[str] = None, timeout: float = 60) -> subprocess.Popen:
+    """
+    Start the app in a subprocess and wait until it answers /health
+
+    Args:
+        port (int): Port to serve on
+        env (Dict, optional): Environment variables added to the current environment
+        command (str, optional): Python code that starts the server, formatted with the port
+        timeout (float): Seconds to wait for the server to come up
+
+    Returns:
+        subprocess.Popen: The server process
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-c", (command or _SERVER_COMMAND).format(port=port)],
+        cwd=REPO_ROOT,
+        env={**os.environ, **(env or {})}
+    )
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App server exited with code {process.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+
+    stop_app_server(process)
+    raise RuntimeError(f"App server did not answer on port {port} within {timeout}s")
+
+def stop_app_server(process: subprocess.Popen) -> None:
+    """Terminate the app server"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def resident_memory_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MB, or None if it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class MemorySampler:
+    """Samples the resident memory of a process in a background thread"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            value = resident_memory_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            self._stop.wait(self.interval)
+
+    def start(self) -> "MemorySampler":
+        """Start sampling"""
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        """
+        Stop sampling
+
+        Returns:
+            Dict: Memory at the start, peak and end of sampling in MB
+        """
+        self._stop.set()
+        self._thread.join()
+        if not self.samples:
+            return {"start": None, "peak": None, "end": None}
+        return {
+            "start": round(self.samples[0], 1),
+            "peak": round(max(self.samples), 1),
+            "end": round(self.samples[-1], 1)
+        }
+
+
+def percentile(values: List[float], share: float) -> Optional[float]:
+    """Percentile of a list of values by linear interpolation"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * share
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(values: List[float], digits: int = 3) -> Dict[str, Optional[float]]:
+    """Mean, maximum and p50/p90/p99 of latencies"""
+    summary = {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None
+    }
+    return {key: round(value, digits) if isinstance(value, float) else value for key, value in summary.items()}
@@ -0,0 +1,133 @@
+"""
+Serialization micro-benchmark for the chat read endpoints.
+
+Builds chat documents shaped like stored researches (long analyses, many
+references, research data, traces, datetimes and ObjectIds) and measures how
+fast each encoder turns them into a response body:
+
+    json          the previous path: stringify every _id, then Flask's default
+                  json provider (sorted keys)
+    fast          utils.fast_json with the configured backend (orjson when
+                  installed), as a single body
+    fast_stream   utils.fast_json.iter_json_array, the streamed /api/chats body
+
+Runs in-process, without MongoDB or a server.
+
+Usage (from the repository root):
+    python -m benchmarks.json_benchmark --chats 200 --repeat 20
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.harness import latency_summary
+from benchmarks.mock_services import search_response, completion_text
+from utils import fast_json
+
+try:
+    from bson import ObjectId
+except ImportError:
+    ObjectId = None
+
+
+def build_chats(count: int, references: int, analysis_words: int) -> List[Dict[str, Any]]:
+    """Chat documents shaped like completed researches"""
+    now = datetime.now()
+    chats = []
+    for i in range(count):
+        query = f"benchmark topic {i}"
+        results = search_response(query, references, 150)["results"]
+        chats.append({
+            "_id": ObjectId() if ObjectId else str(uuid.uuid4()),
+            "query": query,
+            "created_at": now - timedelta(minutes=i),
+            "completed_at": now - timedelta(minutes=i) + timedelta(minutes=2),
+            "status": "completed",
+            "version": 7,
+            "search_queries": [f"{query} aspect {n}" for n in range(5)],
+            "references": results,
+            "research_data": results,
+            "analysis": completion_text(query, analysis_words),
+            "trace": {
+                "chat_id": str(i),
+                "spans": [
+                    {"id": n, "parent": None, "name": f"stage {n}", "start": n * 0.5, "duration": 0.5, "status": "ok", "attributes": {}}
+                    for n in range(40)
+                ]
+            }
+        })
+    return chats
+
+def _stdlib_body(chats: List[Dict[str, Any]]) -> bytes:
+    """The body /api/chats produced before the fast encoder"""
+    for chat in chats:
+        chat['_id'] = str(chat['_id'])
+    return json.dumps(chats, default=DefaultJSONProvider.default, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+ENCODERS = {
+    "json": _stdlib_body,
+    "fast": fast_json.dumps,
+    "fast_stream": lambda chats: b"".join(fast_json.iter_json_array(chats))
+}
+
+def measure(encode: Callable[[List[Dict[str, Any]]], bytes], chats: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """Time an encoder over fresh copies of the documents"""
+    durations = []
+    size = 0
+    for _ in range(repeat):
+        # The old path stringifies _id in place, so each run gets its own shallow copies
+        documents = [dict(chat) for chat in chats]
+        start = time.perf_counter()
+        size = len(encode(documents))
+        durations.append(time.perf_counter() - start)
+
+    mean = sum(durations) / len(durations)
+    return {
+        "body_bytes": size,
+        "milliseconds": latency_summary([duration * 1000 for duration in durations], digits=3),
+        "mb_per_second": round(size / mean / 1e6, 1) if mean else None,
+        "documents_per_second": round(len(chats) / mean) if mean else None
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serialization throughput of chat documents")
+    parser.add_argument("--chats", type=int, default=200, help="Documents per body")
+    parser.add_argument("--references", type=int, default=12, help="References per chat")
+    parser.add_argument("--analysis-words", type=int, default=2500, help="Words per analysis")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per encoder")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    chats = build_chats(args.chats, args.references, args.analysis_words)
+    encoders = {name: measure(encode, chats, args.repeat) for name, encode in ENCODERS.items()}
+    baseline = encoders["json"]["milliseconds"]["mean"]
+    for result in encoders.values():
+        result["speedup"] = round(baseline / result["milliseconds"]["mean"], 2) if result["milliseconds"]["mean"] else None
+
+    results = json.dumps({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "chats": args.chats,
+            "references": args.references,
+            "analysis_words": args.analysis_words,
+            "repeat": args.repeat,
+            "backend": fast_json.BACKEND
+        },
+        "encoders": encoders
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(results + "\n")
+    else:
+        print(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
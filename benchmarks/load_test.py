@@ -0,0 +1,234 @@
+"""
+Load test for the read endpoints the web UI polls: /api/chats, /api/chat/<id>
+and /api/research/status/<id>.
+
+Each simulated browser session follows the pattern in static/js/main.js: load
+the chat list, open a chat, and while its research is in progress poll its
+status every two seconds, then reload the chat and the chat list when it
+completes. Like the UI, each session revalidates responses it has seen with
+If-None-Match. Requests/sec, 304 responses, latency percentiles per endpoint
+and server memory are reported as JSON.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --sessions 200 --duration 60 --in-memory
+    python -m benchmarks.load_test --server http://127.0.0.1:5000 --sessions 50
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmarks.harness import start_app_server, stop_app_server, MemorySampler, latency_summary
+from benchmarks.mock_services import search_response, completion_text
+
+# Starts the app after seeding its database in the same process, so an in-memory stand-in can be used
+_SEEDED_SERVER_COMMAND = (
+    "from benchmarks.load_test import seed_chats; seed_chats({chats}, {in_progress_share}); "
+    "from app import app; app.run(host='127.0.0.1', port={{port}}, threaded=True, debug=False)"
+)
+
+
+def seed_chats(count: int, in_progress_share: float = 0.3) -> List[str]:
+    """
+    Insert chats shaped like finished and running researches
+
+    Args:
+        count (int): Number of chats
+        in_progress_share (float): Share of chats left in progress, which sessions poll
+
+    Returns:
+        List[str]: The chat IDs
+    """
+    from models.database import chats_collection
+
+    now = datetime.now()
+    chats = []
+    for i in range(count):
+        query = f"load test topic {i}"
+        references = search_response(query, 10, 150)["results"]
+        in_progress = i < count * in_progress_share
+        chat = {
+            "_id": str(uuid.uuid4()),
+            "query": query,
+            "created_at": now - timedelta(minutes=i),
+            "status": "in_progress" if in_progress else "completed",
+            "search_queries": [f"{query} aspect {n}" for n in range(5)],
+            "references": references
+        }
+        if not in_progress:
+            chat["analysis"] = completion_text(query, 2000)
+            chat["completed_at"] = now - timedelta(minutes=i) + timedelta(minutes=2)
+        chats.append(chat)
+
+    chats_collection.insert_many(chats)
+    return [chat["_id"] for chat in chats]
+
+
+class Stats:
+    """Latencies and errors per endpoint, shared by the session threads"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.not_modified = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, latency: float, ok: bool, not_modified: bool = False) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if not ok:
+                self.errors[endpoint] += 1
+            if not_modified:
+                self.not_modified[endpoint] += 1
+
+
+def _get(session: requests.Session, server: str, path: str, endpoint: str, stats: Stats, cache: Dict[str, Any]) -> Optional[Any]:
+    """
+    Issue one GET and record its latency under the endpoint name. Like fetchJsonCached
+    in the web UI, the ETag of the last response for the path is sent as If-None-Match
+    and a 304 is answered from the cached body.
+    """
+    cached = cache.get(path)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    start = time.perf_counter()
+    try:
+        response = session.get(f"{server}{path}", headers=headers, timeout=30)
+        if response.status_code == 304 and cached:
+            stats.add(endpoint, time.perf_counter() - start, True, not_modified=True)
+            return cached[1]
+        stats.add(endpoint, time.perf_counter() - start, response.ok)
+        if not response.ok:
+            return None
+        data = response.json()
+        if response.headers.get("ETag"):
+            cache[path] = (response.headers["ETag"], data)
+        return data
+    except (requests.exceptions.RequestException, ValueError):
+        stats.add(endpoint, time.perf_counter() - start, False)
+        return None
+
+def browser_session(server: str, deadline: float, args: argparse.Namespace, stats: Stats, seed: int) -> None:
+    """Simulate one browser tab until the deadline"""
+    rng = random.Random(seed)
+    session = requests.Session()
+    cache = {}
+
+    while time.time() < deadline:
+        chats = _get(session, server, "/api/chats", "/api/chats", stats, cache)
+        if not chats:
+            time.sleep(args.poll_interval)
+            continue
+
+        chat = rng.choice(chats)
+        chat_id = chat["_id"]
+        _get(session, server, f"/api/chat/{chat_id}", "/api/chat/<id>", stats, cache)
+
+        if chat.get("status") == "in_progress":
+            # Follow the research the way startStatusPolling does, then reload as handleResearchComplete does
+            for _ in range(args.polls_per_research):
+                if time.time() >= deadline:
+                    return
+                time.sleep(args.poll_interval)
+                _get(session, server, f"/api/research/status/{chat_id}", "/api/research/status/<id>", stats, cache)
+            _get(session, server, f"/api/chat/{chat_id}", "/api/chat/<id>", stats, cache)
+            _get(session, server, "/api/chats", "/api/chats", stats, cache)
+
+        # Reading time before the user opens another chat
+        time.sleep(rng.uniform(0, args.think_time * 2))
+
+def run_load_test(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the load test described by the command line arguments"""
+    process = None
+    server = args.server
+    if not server:
+        env = {"MONGO_URI": "mongomock://"} if args.in_memory else {}
+        command = _SEEDED_SERVER_COMMAND.format(chats=args.chats, in_progress_share=args.in_progress_share)
+        process = start_app_server(args.port, env=env, command=command, timeout=120)
+        server = f"http://127.0.0.1:{args.port}"
+    sampler = MemorySampler(process.pid).start() if process else None
+
+    stats = Stats()
+    try:
+        start = time.perf_counter()
+        deadline = time.time() + args.duration
+        threads = []
+        for i in range(args.sessions):
+            thread = threading.Thread(target=browser_session, args=(server, deadline, args, stats, args.seed + i), daemon=True)
+            threads.append(thread)
+            thread.start()
+            # Spread session start-up over the first poll interval
+            time.sleep(args.poll_interval / args.sessions)
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - start
+    finally:
+        memory = sampler.stop() if sampler else None
+        if process:
+            stop_app_server(process)
+
+    total_requests = sum(len(values) for values in stats.latencies.values())
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "sessions": args.sessions,
+            "duration": args.duration,
+            "poll_interval": args.poll_interval,
+            "polls_per_research": args.polls_per_research,
+            "think_time": args.think_time,
+            "chats": None if args.server else args.chats,
+            "in_progress_share": None if args.server else args.in_progress_share,
+            "database": "external" if args.server else ("in-memory" if args.in_memory else "mongodb")
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "requests": total_requests,
+        "errors": sum(stats.errors.values()),
+        "not_modified": sum(stats.not_modified.values()),
+        "requests_per_second": round(total_requests / wall_seconds, 2) if wall_seconds else None,
+        "endpoints": {
+            endpoint: {
+                "requests": len(values),
+                "errors": stats.errors[endpoint],
+                "not_modified": stats.not_modified[endpoint],
+                "requests_per_second": round(len(values) / wall_seconds, 2) if wall_seconds else None,
+                "latency_ms": latency_summary([value * 1000 for value in values], digits=2)
+            }
+            for endpoint, values in sorted(stats.latencies.items())
+        },
+        "server_memory_mb": memory
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test for the chat and status read endpoints")
+    parser.add_argument("--server", help="Test a running server instead of starting a seeded one")
+    parser.add_argument("--in-memory", action="store_true", help="Seed an in-memory database (needs mongomock) instead of MongoDB")
+    parser.add_argument("--port", type=int, default=5056, help="Port for the started server")
+    parser.add_argument("--chats", type=int, default=100, help="Chats to seed")
+    parser.add_argument("--in-progress-share", type=float, default=0.3, help="Share of seeded chats left in progress")
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent browser sessions")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between status polls, as in the UI")
+    parser.add_argument("--polls-per-research", type=int, default=30, help="Status polls while following one research")
+    parser.add_argument("--think-time", type=float, default=5.0, help="Mean seconds a session spends reading a chat")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the sessions' choices")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = json.dumps(run_load_test(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(results + "\n")
+    else:
+        print(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
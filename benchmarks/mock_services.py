@@ -0,0 +1,268 @@
+"""
+Local stand-ins for the Tavily and Groq APIs, so the research pipeline can be
+benchmarked without API keys or network access
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional
+
+# Topics appended to the research query, distinct enough that query dedupe keeps them apart
+QUERY_ASPECTS = [
+    "history and origins", "economic impact", "regulation and policy", "underlying technology",
+    "criticism and controversy", "future outlook", "case studies", "environmental effects",
+    "public opinion", "key organizations"
+]
+
+_SYLLABLES = ["ka", "lo", "mi", "ter", "son", "var", "del", "qui", "nor", "pha", "sel", "tro", "bel", "gan", "rho", "ux"]
+_VOCABULARY = [a + b + c for a in _SYLLABLES for b in _SYLLABLES[::3] for c in ("", "s", "ion", "al")]
+
+
+class ServiceProfile:
+    """Latency distribution, error rate and rate limit of a stand-in service"""
+
+    def __init__(
+        self,
+        latency_median: float = 0.5,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the profile
+
+        Args:
+            latency_median (float): Median response time in seconds
+            latency_sigma (float): Sigma of the log-normal latency distribution, 0 for a fixed latency
+            error_rate (float): Share of requests answered with a 500 error
+            requests_per_minute (int, optional): Requests beyond this rate are answered with a 429
+            seed (int, optional): Seed for reproducible latencies and errors
+        """
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.requests_per_minute = requests_per_minute
+        self._random = random.Random(seed)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def latency(self) -> float:
+        """Draw a response time"""
+        with self._lock:
+            return self.latency_median * math.exp(self.latency_sigma * self._random.gauss(0, 1))
+
+    def admit(self) -> Optional[int]:
+        """
+        Decide how to answer the next request
+
+        Returns:
+            Optional[int]: The error status to answer with, or None to answer normally
+        """
+        with self._lock:
+            now = time.time()
+            self.stats["requests"] += 1
+
+            if self.requests_per_minute:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.requests_per_minute:
+                    self.stats["rate_limited"] += 1
+                    return 429
+                self._recent.append(now)
+
+            if self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500
+
+            return None
+
+
+def _words(seed: str, count: int) -> str:
+    """Deterministic filler text, different for every seed"""
+    rng = random.Random(zlib.crc32(seed.encode("utf-8")))
+    return " ".join(rng.choice(_VOCABULARY) for _ in range(count))
+
+def search_response(query: str, max_results: int, words: int) -> Dict[str, Any]:
+    """Tavily-style search results for a query"""
+    key = f"{zlib.crc32(query.encode('utf-8')):08x}"
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"{query.title()} - source {i + 1}",
+                "url": f"https://source{i}.example.com/{key}/article-{i}",
+                "content": _words(f"{query}/{i}", words),
+                "score": round(1 - i / (max_results + 1), 3)
+            }
+            for i in range(max_results)
+        ]
+    }
+
+def completion_text(prompt: str, words: int) -> str:
+    """Text in the shape the research agents expect for a prompt"""
+    match = re.search(r"Generate (\d+)", prompt)
+    if "JSON array" in prompt:
+        count = int(match.group(1)) if match else 5
+        # Both query prompts put the research topic on their second line
+        lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+        topic = " ".join(lines[1].split()[:8]) if len(lines) > 1 else "the topic"
+        offset = zlib.crc32(prompt.encode("utf-8"))
+        aspects = [QUERY_ASPECTS[(offset + i) % len(QUERY_ASPECTS)] for i in range(count)]
+        return json.dumps([f"{topic} {aspect}" for aspect in aspects])
+
+    paragraphs = []
+    for i in range(max(words // 80, 1)):
+        paragraphs.append(f"{_words(f'{prompt[:200]}/{i}', 80)} [{i % 5 + 1}].")
+    return "\n\n".join(paragraphs)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler serving both stand-in APIs"""
+
+    server_version = "MockService/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        service = self.server.service
+
+        if self.path.rstrip("/") != service.path:
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        status = service.profile.admit()
+        if status == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached"}}, {"Retry-After": "1"})
+            return
+
+        latency = service.profile.latency()
+        if status:
+            time.sleep(latency)
+            self._send_json(status, {"error": {"message": "Injected server error"}})
+            return
+
+        service.handle(self, payload, latency)
+
+
+class MockService:
+    """Base class for a stand-in API served from a background thread"""
+
+    path = "/"
+
+    def __init__(self, profile: ServiceProfile, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        """Base URL to configure the client with"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockService":
+        """Start serving"""
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, handler: _Handler, payload: Dict[str, Any], latency: float) -> None:
+        """Answer a request that was neither rate limited nor failed"""
+        raise NotImplementedError
+
+
+class MockTavily(MockService):
+    """Stand-in for the Tavily search API"""
+
+    path = "/search"
+
+    def __init__(self, profile: ServiceProfile, result_words: int = 150, **kwargs):
+        super().__init__(profile, **kwargs)
+        self.result_words = result_words
+
+    def handle(self, handler: _Handler, payload: Dict[str, Any], latency: float) -> None:
+        time.sleep(latency)
+        handler._send_json(200, search_response(str(payload.get("query", "")), int(payload.get("max_results", 5)), self.result_words))
+
+
+class MockGroq(MockService):
+    """Stand-in for the Groq chat completions API, with and without streaming"""
+
+    path = "/chat/completions"
+
+    def __init__(self, profile: ServiceProfile, completion_words: int = 1200, **kwargs):
+        super().__init__(profile, **kwargs)
+        self.completion_words = completion_words
+
+    def handle(self, handler: _Handler, payload: Dict[str, Any], latency: float) -> None:
+        messages: List[Dict[str, str]] = payload.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        words = min(self.completion_words, int(payload.get("max_tokens", 2000) * 0.75))
+        text = completion_text(prompt, words)
+        model = payload.get("model", "")
+        usage = {
+            "prompt_tokens": sum(len(m.get("content", "")) for m in messages) // 4,
+            "completion_tokens": len(text) // 4
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not payload.get("stream"):
+            time.sleep(latency)
+            handler._send_json(200, {
+                "id": "mock-completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        # Spend part of the latency before the first token and spread the rest over the chunks
+        chunks = [text[i:i + 200] for i in range(0, len(text), 200)] or [""]
+        time.sleep(latency * 0.3)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+        try:
+            for i, chunk in enumerate(chunks):
+                last = i == len(chunks) - 1
+                event = {
+                    "id": "mock-completion",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": "stop" if last else None}]
+                }
+                if last:
+                    event["x_groq"] = {"usage": usage}
+                handler.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                handler.wfile.flush()
+                time.sleep(latency * 0.7 / len(chunks))
+            handler.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the research mid-stream
+            pass
@@ -0,0 +1,148 @@
+"""
+End-to-end research benchmark against local stand-in Tavily and Groq servers.
+
+Starts the stand-in services, runs the Flask app pointed at them, submits
+researches with a fixed concurrency and reports job latency, throughput and
+server memory as JSON. The app still needs MongoDB at MONGO_URI.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmark --jobs 20 --concurrency 4 --output bench.json
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmarks.harness import start_app_server, stop_app_server, MemorySampler, latency_summary
+from benchmarks.mock_services import ServiceProfile, MockTavily, MockGroq
+
+
+def run_job(server: str, query: str, poll_interval: float, timeout: float) -> Dict[str, Any]:
+    """
+    Start one research and poll its status until it finishes
+
+    Returns:
+        Dict: Outcome and latency of the research
+    """
+    start = time.perf_counter()
+    response = requests.post(f"{server}/api/research/start", json={"query": query, "force_refresh": True}, timeout=30)
+    response.raise_for_status()
+    chat_id = response.json()["chat_id"]
+
+    outcome = "timed_out"
+    while time.perf_counter() - start < timeout:
+        status = requests.get(f"{server}/api/research/status/{chat_id}", timeout=30).json()
+        if status.get("completed"):
+            outcome = "completed"
+            break
+        if status.get("error") or status.get("message", "").startswith(("Research failed", "Error:", "Research stopped")):
+            outcome = "failed"
+            break
+        time.sleep(poll_interval)
+
+    return {"chat_id": chat_id, "outcome": outcome, "latency": time.perf_counter() - start}
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark described by the command line arguments"""
+    tavily = MockTavily(ServiceProfile(
+        latency_median=args.tavily_latency,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        requests_per_minute=args.tavily_rpm,
+        seed=args.seed
+    )).start()
+    groq = MockGroq(ServiceProfile(
+        latency_median=args.groq_latency,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        requests_per_minute=args.groq_rpm,
+        seed=args.seed
+    ), completion_words=args.completion_words).start()
+
+    process = start_app_server(args.port, env={
+        "TAVILY_BASE_URL": tavily.base_url,
+        "GROQ_BASE_URL": groq.base_url,
+        "TAVILY_API_KEY": "benchmark",
+        "GROQ_API_KEY": "benchmark"
+    })
+    server = f"http://127.0.0.1:{args.port}"
+    sampler = MemorySampler(process.pid).start()
+
+    run_id = uuid.uuid4().hex[:8]
+    queries = [f"benchmark {run_id} topic {i}" for i in range(args.jobs)]
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            jobs: List[Dict[str, Any]] = list(executor.map(
+                lambda query: run_job(server, query, args.poll_interval, args.timeout),
+                queries
+            ))
+        wall_seconds = time.perf_counter() - start
+    finally:
+        memory = sampler.stop()
+        stop_app_server(process)
+        tavily.stop()
+        groq.stop()
+
+    completed = [job["latency"] for job in jobs if job["outcome"] == "completed"]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "jobs": args.jobs,
+            "concurrency": args.concurrency,
+            "tavily_latency": args.tavily_latency,
+            "groq_latency": args.groq_latency,
+            "latency_sigma": args.latency_sigma,
+            "error_rate": args.error_rate,
+            "tavily_rpm": args.tavily_rpm,
+            "groq_rpm": args.groq_rpm,
+            "completion_words": args.completion_words,
+            "seed": args.seed
+        },
+        "jobs": {
+            outcome: sum(1 for job in jobs if job["outcome"] == outcome)
+            for outcome in ("completed", "failed", "timed_out")
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_per_minute": round(len(completed) / wall_seconds * 60, 3) if wall_seconds else None,
+        "job_latency_seconds": latency_summary(completed),
+        "server_memory_mb": memory,
+        "services": {"tavily": tavily.profile.stats, "groq": groq.profile.stats}
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end research benchmark")
+    parser.add_argument("--jobs", type=int, default=8, help="Number of researches to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Researches in flight at once")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the app under test")
+    parser.add_argument("--tavily-latency", type=float, default=0.8, help="Median Tavily latency in seconds")
+    parser.add_argument("--groq-latency", type=float, default=2.0, help="Median Groq latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="Log-normal sigma of both latency distributions")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failed with a 500")
+    parser.add_argument("--tavily-rpm", type=int, default=None, help="Tavily requests per minute before 429s")
+    parser.add_argument("--groq-rpm", type=int, default=None, help="Groq requests per minute before 429s")
+    parser.add_argument("--completion-words", type=int, default=1200, help="Words per drafted completion")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between status polls")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds before a research counts as timed out")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for latencies and injected errors")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(results + "\n")
+    else:
+        print(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
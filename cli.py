@@ -0,0 +1,110 @@
+import argparse
+import gzip
+import json
+import shutil
+import sys
+import time
+import requests
+
+DEFAULT_SERVER = "http://127.0.0.1:5000"
+
+def read_queries(path):
+    """Read one query per line, skipping blank lines and # comments"""
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        return [line.strip() for line in stream if line.strip() and not line.strip().startswith("#")]
+
+def run_batch(args):
+    """Submit a batch of research queries and follow its progress"""
+    queries = read_queries(args.queries_file)
+    if not queries:
+        print("No queries found", file=sys.stderr)
+        return 1
+
+    response = requests.post(
+        f"{args.server}/api/research/batch",
+        json={"queries": queries, "force_refresh": args.force_refresh}
+    )
+    if response.status_code != 200:
+        print(f"Failed to submit batch: {response.text}", file=sys.stderr)
+        return 1
+
+    batch_id = response.json()["batch_id"]
+    print(f"Submitted batch {batch_id} with {len(queries)} queries")
+
+    if args.no_wait:
+        return 0
+
+    while True:
+        time.sleep(args.poll_interval)
+        status = requests.get(f"{args.server}/api/research/batch/{batch_id}").json()
+        counts = status["counts"]
+        print(
+            f"[{status['elapsed_seconds']:>7.1f}s] {status['progress']:5.1f}% | "
+            f"queued {counts['queued']} running {counts['running']} "
+            f"completed {counts['completed']} failed {counts['failed']} stopped {counts['stopped']} | "
+            f"{status['throughput_per_minute']} jobs/min"
+        )
+        if status["finished"]:
+            break
+
+    for job in status["jobs"]:
+        print(f"{job['state']:>10}  {job['chat_id']}  {job['query']}")
+
+    return 0 if counts["failed"] == 0 else 2
+
+def _exported_chats(response):
+    """Decode chats one at a time from a streamed export response"""
+    with gzip.GzipFile(fileobj=response.raw) as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+def run_export(args):
+    """Stream the chat archive to a gzip JSON lines or Parquet file"""
+    params = {name: value for name, value in (("since", args.since), ("until", args.until), ("status", args.status)) if value}
+    with requests.get(f"{args.server}/api/export", params=params, stream=True) as response:
+        if response.status_code != 200:
+            print(f"Export failed: {response.text}", file=sys.stderr)
+            return 1
+
+        if args.format == "parquet":
+            from utils.export import write_parquet
+            try:
+                count = write_parquet(_exported_chats(response), args.output)
+            except RuntimeError as e:
+                print(str(e), file=sys.stderr)
+                return 1
+            print(f"Exported {count} chats to {args.output}")
+        else:
+            with open(args.output, "wb") as output:
+                shutil.copyfileobj(response.raw, output)
+            print(f"Exported chats to {args.output}")
+
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deep Research AI command line tools")
+    parser.add_argument("--server", default=DEFAULT_SERVER, help="Base URL of the Deep Research AI server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch_parser = subparsers.add_parser("batch", help="Run a batch of research queries")
+    batch_parser.add_argument("queries_file", help="File with one query per line, or - for stdin")
+    batch_parser.add_argument("--force-refresh", action="store_true", help="Do not attach to identical running research")
+    batch_parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between progress updates")
+    batch_parser.add_argument("--no-wait", action="store_true", help="Submit the batch and exit")
+    batch_parser.set_defaults(func=run_batch)
+
+    export_parser = subparsers.add_parser("export", help="Export chats and research data")
+    export_parser.add_argument("output", help="Output file, e.g. chats.jsonl.gz or chats.parquet")
+    export_parser.add_argument("--since", help="Only chats created at or after this ISO date")
+    export_parser.add_argument("--until", help="Only chats created before this ISO date")
+    export_parser.add_argument("--status", help="Only chats with this status, e.g. completed")
+    export_parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="gzip JSON lines, or columnar Parquet (needs pyarrow)")
+    export_parser.set_defaults(func=run_export)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,12 +8,36 @@ load_dotenv()
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 
+# API endpoints, overridable to point the clients at local stand-in servers
+TAVILY_BASE_URL = os.getenv("TAVILY_BASE_URL", "https://api.tavily.com").rstrip("/")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+
+# Record or replay Tavily and Groq interactions: "record", "replay" or empty
+API_REPLAY_MODE = os.getenv("API_REPLAY_MODE", "")
+API_REPLAY_FILE = os.getenv("API_REPLAY_FILE", "api_recording.jsonl.gz")
+API_REPLAY_LATENCY_SCALE = float(os.getenv("API_REPLAY_LATENCY_SCALE", "1.0"))  # 0 replays without delay
+
 # MongoDB
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 
 # Flask
 SECRET_KEY = os.getenv("SECRET_KEY", "deep-research-ai-secret-key")
 
+# ASGI mode (asgi.py)
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "200"))  # Shared by all research jobs
+
+# JSON serialization of API responses: "orjson" (when installed) or "json"
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson")
+
+# Search over past research
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Response compression
+COMPRESSION_MIN_BYTES = 1024  # Smaller bodies are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Used when the optional brotli package is installed
+
 # Models - Ensure llama-3.3-70b-versatile is first and default
 GROQ_MODELS = {
     "llama-3.3-70b-versatile": "llama-3.3-70b-versatile",
@@ -26,6 +50,53 @@ DEFAULT_MODEL = "llama-3.3-70b-versatile"
 MIN_WORDS = 2000
 MAX_TOKENS = 8000
 
+# Generated search queries at least this similar to an earlier one are not searched
+QUERY_SIMILARITY_THRESHOLD = 0.75
+
+# Iterative research: follow-up search rounds while results keep adding new content
+ITERATIVE_RESEARCH = os.getenv("ITERATIVE_RESEARCH", "false").lower() == "true"
+MAX_RESEARCH_ROUNDS = 3
+MAX_TOTAL_SEARCHES = 15
+MAX_RESEARCH_TOKENS = 20000  # LLM tokens a research may spend, drafting included
+DRAFTING_TOKEN_RESERVE = 12000  # Tokens kept for drafting when deciding on another round
+NOVELTY_THRESHOLD = 0.25  # Minimum share of new content for another round
+FOLLOW_UP_QUERIES = 3
+
+# Searches run concurrently within a round
+SEARCH_CONCURRENCY = 5
+
+# Progressive drafting: start drafting before every search has finished. Ignored with ITERATIVE_RESEARCH
+PROGRESSIVE_DRAFTING = os.getenv("PROGRESSIVE_DRAFTING", "false").lower() == "true"
+PROGRESSIVE_DRAFT_FRACTION = 0.6  # Share of searches that must finish before drafting starts
+PROGRESSIVE_DRAFT_DEADLINE = 20  # Seconds after which drafting starts with any results
+LATE_RESULTS_POLICY = os.getenv("LATE_RESULTS_POLICY", "drop")  # "drop", or "refine", which adds a full rewrite of the analysis
+LATE_RESULTS_GRACE = 30  # Seconds to wait for late searches after drafting
+
+# Search result deduplication
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity of word shingles
+
+# Local reranking of search results before drafting
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "12"))
+RERANK_TAVILY_WEIGHT = 0.3
+
+# Model context windows and completion limits, in tokens
+MODEL_TOKEN_BUDGETS = {
+    "llama-3.3-70b-versatile": {"context_window": 131072, "max_output_tokens": 32768},
+    "mixtral-8x7b-32768": {"context_window": 32768, "max_output_tokens": 32768},
+    "gemma-7b-it": {"context_window": 8192, "max_output_tokens": 8192}
+}
+MAX_OUTPUT_SHARE = 0.5  # Largest share of the context window a completion may use
+PROMPT_SAFETY_MARGIN = 0.05  # Share of the context window left unused for estimation error
+MAX_REFERENCE_CHARS = 1000
+MIN_REFERENCE_CHARS = 200
+
+# Drafting mode: "single" completion or concurrent "sections"
+DRAFTING_MODE = os.getenv("DRAFTING_MODE", "single")
+SECTION_DRAFTING_WORKERS = 7
+SECTION_REFERENCES = 6
+SECTION_MAX_TOKENS = 2000
+
 # Rate limits
 RATE_LIMITS = {
     "llama-3.3-70b-versatile": {"requests_per_minute": 10, "tokens_per_minute": 50000},
@@ -33,3 +104,29 @@ RATE_LIMITS = {
     "gemma-7b-it": {"requests_per_minute": 20, "tokens_per_minute": 100000}
 }
 
+# Research scheduling
+MAX_CONCURRENT_BATCH_RESEARCH = int(os.getenv("MAX_CONCURRENT_BATCH_RESEARCH", "4"))  # Interactive research is not limited
+LLM_CALLS_PER_RESEARCH = 2
+TOKENS_PER_RESEARCH = 12000
+BATCH_BUDGET_SHARE = 0.7
+MAX_BATCH_SIZE = 200
+BATCH_RETENTION = 3600  # Seconds a finished batch can still be queried
+
+# Blocking Tavily and Groq calls in flight at once with python app.py. The default leaves room for
+# every batch worker's concurrent searches or section drafts, and as many again for interactive research
+HTTP_MAX_IN_FLIGHT = int(os.getenv(
+    "HTTP_MAX_IN_FLIGHT",
+    str(2 * MAX_CONCURRENT_BATCH_RESEARCH * max(SEARCH_CONCURRENCY, SECTION_DRAFTING_WORKERS))
+))
+
+# Speculative search query generation while the user is typing
+QUERY_PREFETCH = os.getenv("QUERY_PREFETCH", "true").lower() == "true"
+PREFETCH_TTL = 60  # Seconds prefetched queries stay usable
+PREFETCH_MIN_CHARS = 12  # Shorter drafts are not worth a completion
+PREFETCH_MAX_INFLIGHT = 2
+PREFETCH_MAX_ENTRIES = 200
+PREFETCH_BUDGET_SHARE = 0.3  # Prefetches only start on models below this share of their per-minute limits
+PREFETCH_JOIN_TIMEOUT = 10  # Seconds a research waits for a matching prefetch still running
+
+# Tracing
+MAX_TRACE_SPANS = 500  # Spans kept per research trace
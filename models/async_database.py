@@ -0,0 +1,123 @@
+import asyncio
+import itertools
+import logging
+from config import MONGO_URI
+from models import database
+from utils.metrics import external_call
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+logger = logging.getLogger(__name__)
+
+# The async driver is used when installed; otherwise the blocking functions run in worker threads
+_chats_collection = None
+if AsyncIOMotorClient is None:
+    logger.info("motor is not installed, async routes run MongoDB calls in threads")
+elif MONGO_URI.startswith("mongomock://"):
+    logger.info("MONGO_URI uses the in-memory mongomock database, which motor cannot reach; async routes run MongoDB calls in threads")
+else:
+    _chats_collection = AsyncIOMotorClient(MONGO_URI)['deep_research_db']['chats']
+
+async def get_chat(chat_id):
+    """Get a chat by ID"""
+    if _chats_collection is None:
+        return await asyncio.to_thread(database.get_chat, chat_id)
+    with external_call("mongo", "get_chat"):
+        return await _chats_collection.find_one({"_id": chat_id}, database.WITHOUT_TRACE)
+
+async def get_trace_document(chat_id):
+    """Get a chat by ID with only its trace, or None if the chat does not exist"""
+    if _chats_collection is None:
+        return await asyncio.to_thread(database.get_trace_document, chat_id)
+    with external_call("mongo", "get_trace_document"):
+        return await _chats_collection.find_one({"_id": chat_id}, {"trace": 1})
+
+async def get_chat_version(chat_id):
+    """Get the version of a chat, which changes on every update, without loading the chat"""
+    if _chats_collection is None:
+        return await asyncio.to_thread(database.get_chat_version, chat_id)
+    with external_call("mongo", "get_chat_version"):
+        chat = await _chats_collection.find_one({"_id": chat_id}, {"version": 1})
+    if not chat:
+        return None
+    return chat.get("version", 0)
+
+async def get_chats_version():
+    """Summary of the chat list that changes whenever a chat is created, updated or removed"""
+    if _chats_collection is None:
+        return await asyncio.to_thread(database.get_chats_version)
+    with external_call("mongo", "get_chats_version"):
+        summary = await _chats_collection.aggregate([
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "versions": {"$sum": "$version"},
+                "latest": {"$max": "$created_at"}
+            }}
+        ]).to_list(length=1)
+    if not summary:
+        return 0, 0, None
+    return summary[0]["count"], summary[0]["versions"], summary[0]["latest"]
+
+async def iter_all_chats(batch_size=500, projection=None):
+    """
+    Iterate over all chats newest first, fetching them in batches
+
+    Args:
+        batch_size (int): Documents fetched per round trip
+        projection (dict, optional): Fields to return, all fields by default
+
+    Yields:
+        dict: The chats
+    """
+    if _chats_collection is None:
+        chats = database.iter_chats(batch_size=batch_size, newest_first=True, projection=projection)
+        while True:
+            batch = await asyncio.to_thread(list, itertools.islice(chats, batch_size))
+            if not batch:
+                return
+            for chat in batch:
+                yield chat
+    else:
+        await asyncio.to_thread(database.ensure_indexes)
+        async for chat in _chats_collection.find({}, projection).sort('created_at', -1).batch_size(batch_size):
+            yield chat
+
+async def search_chats(text, skip=0, limit=20):
+    """
+    Full-text search over chat queries, reference titles and analyses
+
+    Args:
+        text (str): The search text, in MongoDB $text syntax
+        skip (int): Number of results to skip
+        limit (int): Maximum number of results
+
+    Returns:
+        Tuple[List[dict], int]: The matching chats, best match first, and the total number of matches
+    """
+    if _chats_collection is None:
+        return await asyncio.to_thread(database.search_chats, text, skip, limit)
+
+    await asyncio.to_thread(database.ensure_indexes)
+
+    query = {"$text": {"$search": text}}
+    projection = {
+        "score": {"$meta": "textScore"},
+        "query": 1,
+        "status": 1,
+        "created_at": 1,
+        "analysis": 1,
+        "references.title": 1
+    }
+    with external_call("mongo", "search_chats"):
+        chats = await (
+            _chats_collection.find(query, projection)
+            .sort([("score", {"$meta": "textScore"})])
+            .skip(skip)
+            .limit(limit)
+            .to_list(length=limit)
+        )
+        return chats, await _chats_collection.count_documents(query)
@@ -1,16 +1,51 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, TEXT
 import chromadb
 import logging
+import threading
 from config import MONGO_URI
+from utils.metrics import timed_call
 
 logger = logging.getLogger(__name__)
 
 # Initialize MongoDB
-mongo_client = MongoClient(MONGO_URI)
+if MONGO_URI.startswith("mongomock://"):
+    # In-memory stand-in for benchmarks and load tests, needs the optional mongomock package
+    import mongomock
+    mongo_client = mongomock.MongoClient()
+else:
+    mongo_client = MongoClient(MONGO_URI)
 db = mongo_client['deep_research_db']
 chats_collection = db['chats']
 settings_collection = db['settings']
 
+# Chat indexes, created on the first search or listing so that importing this module
+# does not block on building them; MongoDB keeps them up to date on every write
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+def ensure_indexes():
+    """Create the chat indexes if this process has not done so yet"""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    
+    with _indexes_lock:
+        if _indexes_ready:
+            return
+        try:
+            # Full-text search over past research
+            chats_collection.create_index(
+                [("query", TEXT), ("references.title", TEXT), ("analysis", TEXT)],
+                weights={"query": 10, "references.title": 3, "analysis": 1},
+                name="chat_text"
+            )
+            # The chat list and the export, sorted by creation time and filtered by status
+            chats_collection.create_index([("created_at", DESCENDING)], name="chat_created_at")
+            chats_collection.create_index([("status", ASCENDING), ("created_at", DESCENDING)], name="chat_status_created_at")
+            _indexes_ready = True
+        except Exception as e:
+            logger.error(f"Error creating chat indexes: {str(e)}")
+
 # Initialize ChromaDB
 try:
     chroma_client = chromadb.Client()
@@ -24,14 +59,123 @@ except Exception as e:
     logger.error(f"Error initializing ChromaDB: {str(e)}")
     research_collection = None
 
+# Fields of the chat list in the web UI, besides the ID
+CHAT_LIST_FIELDS = {"query": 1, "status": 1}
+
+# The span timeline is only served by the trace endpoint
+WITHOUT_TRACE = {"trace": 0}
+
+@timed_call("mongo")
 def get_chat(chat_id):
-    """Get a chat by ID"""
-    return chats_collection.find_one({"_id": chat_id})
+    """Get a chat by ID, without its trace"""
+    return chats_collection.find_one({"_id": chat_id}, WITHOUT_TRACE)
+
+@timed_call("mongo")
+def get_trace_document(chat_id):
+    """Get a chat by ID with only its trace, or None if the chat does not exist"""
+    return chats_collection.find_one({"_id": chat_id}, {"trace": 1})
+
+@timed_call("mongo")
+def get_chat_version(chat_id):
+    """Get the version of a chat, which changes on every update, without loading the chat"""
+    chat = chats_collection.find_one({"_id": chat_id}, {"version": 1})
+    if not chat:
+        return None
+    return chat.get("version", 0)
 
+@timed_call("mongo")
 def get_all_chats():
     """Get all chats sorted by creation date"""
     return list(chats_collection.find().sort('created_at', -1))
 
+@timed_call("mongo")
+def get_chats_version():
+    """
+    Summary of the chat list that changes whenever a chat is created, updated or removed,
+    computed by the database without loading the chats
+
+    Returns:
+        Tuple[int, int, datetime]: Number of chats, sum of their versions and latest creation time
+    """
+    summary = list(chats_collection.aggregate([
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "versions": {"$sum": "$version"},
+            "latest": {"$max": "$created_at"}
+        }}
+    ]))
+    if not summary:
+        return 0, 0, None
+    return summary[0]["count"], summary[0]["versions"], summary[0]["latest"]
+
+def iter_chats(since=None, until=None, status=None, batch_size=500, newest_first=False, projection=None):
+    """
+    Iterate over chats oldest first, fetching them from a cursor in batches
+    so that memory use does not grow with the number of chats
+
+    Args:
+        since (datetime, optional): Only chats created at or after this time
+        until (datetime, optional): Only chats created before this time
+        status (str, optional): Only chats with this status
+        batch_size (int): Documents fetched per round trip
+        newest_first (bool): Iterate newest first instead, as get_all_chats sorts
+        projection (dict, optional): Fields to return, all fields by default
+
+    Yields:
+        dict: The chats
+    """
+    query = {}
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+    if status:
+        query["status"] = status
+
+    ensure_indexes()
+    cursor = chats_collection.find(query, projection).sort('created_at', -1 if newest_first else 1).batch_size(batch_size)
+    try:
+        for chat in cursor:
+            yield chat
+    finally:
+        cursor.close()
+
+@timed_call("mongo")
+def search_chats(text, skip=0, limit=20):
+    """
+    Full-text search over chat queries, reference titles and analyses
+
+    Args:
+        text (str): The search text, in MongoDB $text syntax ("phrases" and -exclusions work)
+        skip (int): Number of results to skip
+        limit (int): Maximum number of results
+
+    Returns:
+        Tuple[List[dict], int]: The matching chats, best match first, and the total number of matches
+    """
+    ensure_indexes()
+    
+    query = {"$text": {"$search": text}}
+    projection = {
+        "score": {"$meta": "textScore"},
+        "query": 1,
+        "status": 1,
+        "created_at": 1,
+        "analysis": 1,
+        "references.title": 1
+    }
+    chats = list(
+        chats_collection.find(query, projection)
+        .sort([("score", {"$meta": "textScore"})])
+        .skip(skip)
+        .limit(limit)
+    )
+    return chats, chats_collection.count_documents(query)
+
+@timed_call("mongo")
 def create_chat(chat_id, query):
     """Create a new chat"""
     from datetime import datetime
@@ -40,19 +184,22 @@ def create_chat(chat_id, query):
         "_id": chat_id,
         "query": query,
         "created_at": datetime.now(),
-        "status": "in_progress"
+        "status": "in_progress",
+        "version": 1
     }
 
     chats_collection.insert_one(chat_data)
     return chat_data
 
+@timed_call("mongo")
 def update_chat(chat_id, update_data):
     """Update a chat with new data"""
     chats_collection.update_one(
         {"_id": chat_id},
-        {"$set": update_data}
+        {"$set": update_data, "$inc": {"version": 1}}
     )
 
+@timed_call("mongo")
 def get_settings():
     """Get application settings"""
     from config import GROQ_MODELS, DEFAULT_MODEL
@@ -75,6 +222,7 @@ def get_settings():
 
     return settings
 
+@timed_call("mongo")
 def update_settings(new_settings):
     """Update application settings"""
     settings_collection.update_one(
@@ -84,6 +232,7 @@ def update_settings(new_settings):
     )
     return get_settings()
 
+@timed_call("chroma")
 def store_research_data(documents, metadatas, ids):
     """Store research data in ChromaDB"""
     if research_collection:
@@ -98,6 +247,7 @@ def store_research_data(documents, metadatas, ids):
             logger.error(f"Error storing research data: {str(e)}")
     return False
 
+@timed_call("chroma")
 def query_research_data(query, n_results=5):
     """Query research data from ChromaDB"""
     if research_collection:
@@ -53,11 +53,28 @@ const researchProgressText = document.getElementById("research-progress-text")
 const references = document.getElementById("references")
 const stopResearchBtn = document.getElementById("stop-research-btn")
 const settingsBtn = document.getElementById("settings-btn")
+const showTraceBtn = document.getElementById("show-trace-btn")
+const chatSearchInput = document.getElementById("chat-search-input")
+const traceWaterfall = document.getElementById("trace-waterfall")
 
 // State
 let currentChatId = null
+// Identifies this page among the requesters following a coalesced research
+let currentSubscriberId = null
 let activeResearch = false
 let statusPollingInterval = null
+let chatSearchTimeout = null
+let prefetchTimeout = null
+let lastPrefetchedQuery = ""
+
+// Typing pause after which search queries are generated for the draft query
+const PREFETCH_DELAY_MS = 800
+const PREFETCH_MIN_CHARS = 12
+
+// Responses of polled endpoints by URL, revalidated with If-None-Match. The Map keeps
+// insertion order, so the least recently used entry is the first one
+const responseCache = new Map()
+const RESPONSE_CACHE_MAX_ENTRIES = 50
 
 // Add handler functions for Socket.IO events
 function handleResearchStarted(data) {
@@ -151,6 +168,11 @@ document.addEventListener("DOMContentLoaded", () => {
   closeSettingsBtn.addEventListener("click", () => settingsModal.classList.add("hidden"))
   saveSettingsBtn.addEventListener("click", saveSettings)
   stopResearchBtn.addEventListener("click", stopResearch)
+  showTraceBtn.addEventListener("click", toggleTrace)
+  chatSearchInput.addEventListener("input", () => {
+    clearTimeout(chatSearchTimeout)
+    chatSearchTimeout = setTimeout(searchChats, 300)
+  })
   settingsBtn.addEventListener("click", () => {
     const modelSelect = document.getElementById("modal-model-select")
     const modelDescription = document.getElementById("model-description")
@@ -162,6 +184,12 @@ document.addEventListener("DOMContentLoaded", () => {
     document.getElementById("settings-modal").classList.remove("hidden")
   })
 
+  // Let the server start on the search queries during a typing pause
+  queryInput.addEventListener("input", () => {
+    clearTimeout(prefetchTimeout)
+    prefetchTimeout = setTimeout(prefetchQueries, PREFETCH_DELAY_MS)
+  })
+
   // Enter key in input
   queryInput.addEventListener("keypress", (e) => {
     if (e.key === "Enter") {
@@ -221,6 +249,7 @@ function startResearch() {
     console.log("Query is empty, not starting research")
     return
   }
+  clearTimeout(prefetchTimeout)
 
   if (activeResearch) {
     if (!confirm("Research is already in progress. Do you want to stop it and start a new one?")) {
@@ -254,6 +283,12 @@ function startResearch() {
     .then((data) => {
       console.log("Research started successfully:", data)
       currentChatId = data.chat_id
+      currentSubscriberId = data.subscriber_id
+
+      // An identical research was already running; we follow its progress
+      if (data.coalesced) {
+        showToast("Joined an identical research already in progress")
+      }
       activeResearch = true
 
       // Update UI
@@ -298,6 +333,34 @@ function startResearch() {
   queryInput.value = ""
 }
 
+function fetchJsonCached(url) {
+  // Send the ETag of the cached response so an unchanged resource comes back as an empty 304
+  const cached = responseCache.get(url)
+  const headers = cached ? { "If-None-Match": cached.etag } : {}
+  if (cached) {
+    // Mark as most recently used
+    responseCache.delete(url)
+    responseCache.set(url, cached)
+  }
+
+  return fetch(url, { headers }).then((response) => {
+    if (response.status === 304 && cached) {
+      return cached.data
+    }
+    return response.json().then((data) => {
+      const etag = response.headers.get("ETag")
+      if (response.ok && etag) {
+        responseCache.delete(url)
+        responseCache.set(url, { etag, data })
+        while (responseCache.size > RESPONSE_CACHE_MAX_ENTRIES) {
+          responseCache.delete(responseCache.keys().next().value)
+        }
+      }
+      return data
+    })
+  })
+}
+
 function startStatusPolling(chatId) {
   // Clear any existing interval
   if (statusPollingInterval) {
@@ -311,8 +374,7 @@ function startStatusPolling(chatId) {
       return
     }
 
-    fetch(`/api/research/status/${chatId}`)
-      .then((response) => response.json())
+    fetchJsonCached(`/api/research/status/${chatId}`)
       .then((status) => {
         // Update progress
         updateResearchProgress(status)
@@ -362,6 +424,10 @@ function stopResearch() {
   // Stop research via API
   fetch(`/api/research/stop/${currentChatId}`, {
     method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({ subscriber_id: currentSubscriberId }),
   })
     .then((response) => response.json())
     .then((data) => {
@@ -408,6 +474,7 @@ function createNewChat() {
 
   // Reset UI
   currentChatId = null
+  currentSubscriberId = null
   activeResearch = false
   clearInterval(statusPollingInterval)
 
@@ -434,8 +501,7 @@ function createNewChat() {
 }
 
 function loadChats() {
-  fetch("/api/chats")
-    .then((response) => response.json())
+  fetchJsonCached("/api/chats")
     .then((chats) => {
       chatHistory.innerHTML = ""
 
@@ -454,6 +520,57 @@ function loadChats() {
     })
 }
 
+function prefetchQueries() {
+  const query = queryInput.value.trim()
+  if (activeResearch || query.length < PREFETCH_MIN_CHARS || query === lastPrefetchedQuery) return
+  lastPrefetchedQuery = query
+
+  // Best effort: the research works the same if this fails or is skipped
+  fetch("/api/research/prefetch", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ query }),
+  }).catch((error) => console.warn("Query prefetch failed:", error))
+}
+
+function searchChats() {
+  const text = chatSearchInput.value.trim()
+  if (!text) {
+    loadChats()
+    return
+  }
+
+  fetch(`/api/search?q=${encodeURIComponent(text)}`)
+    .then((response) => response.json())
+    .then((data) => {
+      chatHistory.innerHTML = ""
+
+      if (!data.results || data.results.length === 0) {
+        chatHistory.innerHTML = '<p class="text-sm text-gray-500 italic">No matching research</p>'
+        return
+      }
+
+      // addChatToHistory prepends, so add the best match last
+      data.results
+        .slice()
+        .reverse()
+        .forEach((result) => {
+          addChatToHistory(result.chat_id, result.query, result.status)
+          const snippet = result.highlights.analysis[0] || result.highlights.references[0]
+          if (snippet) {
+            const snippetElement = document.createElement("div")
+            snippetElement.className = "text-xs text-gray-500 mt-1 search-snippet"
+            snippetElement.innerHTML = snippet
+            chatHistory.firstChild.appendChild(snippetElement)
+          }
+        })
+    })
+    .catch((error) => {
+      console.error("Error searching chats:", error)
+      chatHistory.innerHTML = '<p class="text-sm text-red-500">Error searching research</p>'
+    })
+}
+
 function addChatToHistory(id, query, status = "in_progress") {
   // Check if chat already exists in history
   const existingChat = document.querySelector(`.chat-item[data-id="${id}"]`)
@@ -521,10 +638,10 @@ function loadChat(id) {
   }
 
   // Fetch chat data
-  fetch(`/api/chat/${id}`)
-    .then((response) => response.json())
+  fetchJsonCached(`/api/chat/${id}`)
     .then((chat) => {
       currentChatId = chat._id
+      currentSubscriberId = null
       activeResearch = chat.status === "in_progress"
 
       // Update UI
@@ -643,6 +760,65 @@ function displayReferences(refs) {
   })
 }
 
+function toggleTrace() {
+  if (!traceWaterfall.classList.contains("hidden")) {
+    traceWaterfall.classList.add("hidden")
+    return
+  }
+  if (!currentChatId) return
+
+  fetch(`/api/chat/${currentChatId}/trace`)
+    .then((response) => response.json())
+    .then((trace) => {
+      displayTrace(trace)
+      traceWaterfall.classList.remove("hidden")
+    })
+    .catch((error) => {
+      console.error("Error loading trace:", error)
+      showToast("Could not load timing", "error")
+    })
+}
+
+function displayTrace(trace) {
+  if (!trace.spans || trace.spans.length === 0) {
+    traceWaterfall.innerHTML = '<p class="text-sm text-gray-500 italic">No timing recorded</p>'
+    return
+  }
+
+  // Depth of each span from its parent chain, for indentation
+  const depths = {}
+  trace.spans.forEach((span) => {
+    depths[span.id] = span.parent ? (depths[span.parent] || 0) + 1 : 0
+  })
+
+  const total = Math.max(trace.duration, ...trace.spans.map((span) => span.start + (span.duration || 0))) || 1
+  traceWaterfall.innerHTML = `<p class="text-xs text-gray-500 mb-2">Total ${total.toFixed(1)}s</p>`
+
+  trace.spans.forEach((span) => {
+    const duration = span.duration === null ? total - span.start : span.duration
+    const left = (span.start / total) * 100
+    const width = Math.max((duration / total) * 100, 0.5)
+    const color = span.status === "ok" ? "bg-indigo-400" : "bg-red-400"
+    const details = Object.entries(span.attributes || {})
+      .map(([key, value]) => `${key}: ${value}`)
+      .join("\n")
+
+    const row = document.createElement("div")
+    row.className = "text-xs"
+    row.title = `${span.name} (${duration.toFixed(2)}s)${details ? "\n" + details : ""}`
+    row.innerHTML = `
+      <div class="flex justify-between text-gray-600" style="padding-left: ${depths[span.id] * 8}px">
+        <span class="truncate">${truncateText(span.name, 36)}</span>
+        <span>${duration.toFixed(2)}s</span>
+      </div>
+      <div class="w-full bg-gray-100 h-1.5 rounded relative">
+        <div class="${color} h-1.5 rounded absolute" style="left: ${left}%; width: ${width}%"></div>
+      </div>
+    `
+    traceWaterfall.appendChild(row)
+  })
+}
+
 function processAnalysisWithCitations(analysis, refs) {
   if (!analysis) return ""
 
@@ -874,8 +1050,7 @@ function handleResearchComplete(chatId, status) {
 
     // If no analysis in status, try to get it from the chat
     if (!analysis) {
-      fetch(`/api/chat/${chatId}`)
-        .then((response) => response.json())
+      fetchJsonCached(`/api/chat/${chatId}`)
         .then((chat) => {
           if (chat.analysis) {
             displayAnalysis(chat.analysis, status.references)
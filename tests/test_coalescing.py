@@ -0,0 +1,69 @@
+import os
+import time
+
+# In-memory MongoDB stand-in, needs the mongomock package
+os.environ.setdefault("MONGO_URI", "mongomock://")
+
+import pytest
+
+import app as app_module
+from utils.scheduler import ResearchScheduler
+
+RESEARCH_SECONDS = 0.3
+
+
+class FakeResearchAgent:
+    """Research agent that takes a fixed time and records when each research started"""
+
+    started_at = {}
+
+    def __init__(self, query, chat_id, status_callback=None):
+        self.query = query
+        self.chat_id = chat_id
+        self.status_callback = status_callback
+        self.error = None
+
+    def start_research(self):
+        FakeResearchAgent.started_at[self.chat_id] = time.time()
+        time.sleep(RESEARCH_SECONDS)
+        self.status_callback(100, "Research completed", analysis=f"Analysis of {self.query}")
+
+    def stop_research(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    FakeResearchAgent.started_at = {}
+    monkeypatch.setattr(app_module, "ResearchAgent", FakeResearchAgent)
+    monkeypatch.setattr(app_module, "research_scheduler", ResearchScheduler(batch_workers=1, jobs_per_minute=1000))
+    return app_module.app.test_client()
+
+
+def _wait_until_started(chat_id, timeout=5):
+    deadline = time.time() + timeout
+    while chat_id not in FakeResearchAgent.started_at and time.time() < deadline:
+        time.sleep(0.01)
+    return FakeResearchAgent.started_at.get(chat_id)
+
+
+def test_interactive_request_promotes_identical_queued_batch_job(client):
+    queries = [f"batch topic number {i}" for i in range(4)] + ["shared research topic"]
+    batch = client.post("/api/research/batch", json={"queries": queries}).get_json()
+    batch_chat_ids = [job["chat_id"] for job in batch["jobs"]]
+    shared_chat_id = batch_chat_ids[-1]
+    assert app_module.research_scheduler.is_queued(shared_chat_id)
+
+    requested_at = time.time()
+    started = client.post("/api/research/start", json={"query": "Shared research topic"}).get_json()
+
+    assert started["coalesced"] is True
+    assert started["chat_id"] == shared_chat_id
+
+    # The joined research starts right away instead of after the four batch jobs ahead of it
+    started_at = _wait_until_started(shared_chat_id)
+    assert started_at is not None
+    assert started_at - requested_at < RESEARCH_SECONDS
+    assert any(chat_id not in FakeResearchAgent.started_at for chat_id in batch_chat_ids[1:-1])
+    assert app_module.research_status[shared_chat_id]["queued"] is False
+
@@ -0,0 +1,14 @@
+from utils.dedup import canonicalize_url
+
+
+def test_canonicalize_url_strips_tracking_and_mobile_hosts():
+    assert canonicalize_url("http://m.example.com/a/?utm_source=x&id=2") == "https://example.com/a?id=2"
+
+
+def test_canonicalize_url_keeps_content_parameters():
+    assert canonicalize_url("https://github.com/o/r/blob/main/x.py?ref=dev") != canonicalize_url("https://github.com/o/r/blob/main/x.py")
+
+
+def test_canonicalize_url_falls_back_on_malformed_netloc():
+    assert canonicalize_url("http://Host:abc/X ") == "http://host:abc/x"
+    assert canonicalize_url("http://[::1/x") == "http://[::1/x"
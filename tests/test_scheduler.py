@@ -0,0 +1,26 @@
+import threading
+import time
+
+from utils.scheduler import ResearchScheduler, PRIORITY_BATCH
+
+
+def test_promote_only_starts_queued_batch_jobs():
+    scheduler = ResearchScheduler(batch_workers=1, jobs_per_minute=1000)
+    release = threading.Event()
+    ran = []
+
+    scheduler.submit("running", release.wait, priority=PRIORITY_BATCH, group="batch")
+    scheduler.submit("queued", lambda: ran.append("queued"), priority=PRIORITY_BATCH, group="batch")
+    time.sleep(0.1)
+
+    assert scheduler.promote("queued") is True
+    assert scheduler.promote("running") is False
+    assert scheduler.promote("unknown") is False
+
+    deadline = time.time() + 2
+    while not ran and time.time() < deadline:
+        time.sleep(0.01)
+    assert ran == ["queued"]
+    assert not scheduler.is_queued("queued")
+
+    release.set()
@@ -2,8 +2,15 @@ import requests
 import logging
 import json
 import os
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterator
 from dotenv import load_dotenv
+from utils.cancellation import CancellationToken, ResearchCancelled
+from utils.metrics import external_call, LLM_TOKENS
+from utils.replay import api_recorder
+from config import TAVILY_BASE_URL, GROQ_BASE_URL, HTTP_MAX_IN_FLIGHT
 
 # Load environment variables
 load_dotenv()
@@ -11,11 +18,108 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Threads that wait for response headers so that cancellable callers are never blocked on them
+_http_executor = ThreadPoolExecutor(max_workers=HTTP_MAX_IN_FLIGHT, thread_name_prefix="http")
+
+def _close_abandoned_response(future) -> None:
+    """Close the response of a request whose caller was cancelled before it completed"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def _post_cancellable(url: str, cancel_token: CancellationToken, **kwargs) -> requests.Response:
+    """
+    Send a streaming POST request that returns as soon as the token is cancelled
+    
+    Args:
+        url (str): The request URL
+        cancel_token (CancellationToken): Token that aborts the request
+        **kwargs: Additional arguments for requests.post
+        
+    Returns:
+        requests.Response: The response, with the body not yet read
+    """
+    cancel_token.raise_if_cancelled()
+    
+    future = _http_executor.submit(requests.post, url, stream=True, **kwargs)
+    finished = threading.Event()
+    future.add_done_callback(lambda _: finished.set())
+    unregister = cancel_token.register(finished.set)
+    try:
+        finished.wait()
+    finally:
+        unregister()
+    
+    if cancel_token.cancelled:
+        # A request still queued for a thread is never sent; one already sent is closed when it returns
+        if not future.cancel():
+            future.add_done_callback(_close_abandoned_response)
+        raise ResearchCancelled("Request cancelled while waiting for a response")
+    
+    return future.result()
+
+def _iter_cancellable(response: requests.Response, cancel_token: CancellationToken, lines: bool = False) -> Iterator[bytes]:
+    """
+    Iterate over a streaming response body, closing the connection on cancellation
+    
+    Args:
+        response (requests.Response): A response opened with stream=True
+        cancel_token (CancellationToken): Token that aborts the read
+        lines (bool): Yield lines instead of raw chunks
+        
+    Returns:
+        Iterator[bytes]: The body chunks or lines
+    """
+    unregister = cancel_token.register(response.close)
+    try:
+        chunks = response.iter_lines() if lines else response.iter_content(chunk_size=8192)
+        for chunk in chunks:
+            cancel_token.raise_if_cancelled()
+            yield chunk
+        cancel_token.raise_if_cancelled()
+    except ResearchCancelled:
+        raise
+    except Exception:
+        # Closing the connection from another thread surfaces as an arbitrary read error
+        if cancel_token.cancelled:
+            raise ResearchCancelled("Request cancelled while reading the response")
+        raise
+    finally:
+        unregister()
+        response.close()
+
+def _replay_call(service: str, target: str, request: Dict[str, Any], cancel_token: Optional[CancellationToken], missing: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Serve a request from the API recording instead of the network
+    
+    Args:
+        service (str): "tavily" or "groq"
+        target (str): The endpoint or model, for metrics and tracing
+        request (Dict): The request payload without credentials
+        cancel_token (CancellationToken, optional): Token that aborts the replayed wait
+        missing (Dict): Response returned when the request was never recorded
+        
+    Returns:
+        Dict[str, Any]: The recorded response
+    """
+    with external_call(service, target) as call:
+        call["replayed"] = True
+        response = api_recorder.replay(service, request, cancel_token)
+        if response is None:
+            call["outcome"] = "error"
+            logger.error(f"No recorded {service} response for this request in {api_recorder.path}")
+            return missing
+        return response
+
 class TavilyClient:
     """Client for interacting with the Tavily API"""
     
     @staticmethod
-    def search(query: str, search_depth: str = "advanced", max_results: int = 5) -> Dict[str, Any]:
+    def search(
+        query: str,
+        search_depth: str = "advanced",
+        max_results: int = 5,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Dict[str, Any]:
         """
         Execute a search using the Tavily API
         
@@ -23,17 +127,11 @@ class TavilyClient:
             query (str): The search query
             search_depth (str): The depth of search ('basic' or 'advanced')
             max_results (int): Maximum number of results to return
+            cancel_token (CancellationToken, optional): Token that aborts the in-flight request
             
         Returns:
             Dict[str, Any]: The search results
         """
-        api_key = os.getenv("TAVILY_API_KEY")
-        if not api_key:
-            logger.error("Tavily API key not found in environment variables")
-            return {"error": "API key not found", "results": []}
-        
-        url = "https://api.tavily.com/search"
-        
         # Ensure query is a string, not a dictionary
         if isinstance(query, dict):
             if 'query' in query:
@@ -41,21 +139,50 @@ class TavilyClient:
             else:
                 query = str(query)
         
-        payload = {
-            "api_key": api_key,
+        request = {
             "query": query,
             "search_depth": search_depth,
             "max_results": max_results
         }
         
-        try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()  # Raise exception for 4XX/5XX responses
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error in Tavily search: {str(e)}")
-            # Return empty results instead of raising an exception
-            return {"error": str(e), "results": []}
+        if api_recorder.replaying:
+            return _replay_call("tavily", "search", request, cancel_token, {"error": "No recorded response", "results": []})
+        
+        api_key = os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            logger.error("Tavily API key not found in environment variables")
+            return {"error": "API key not found", "results": []}
+        
+        url = f"{TAVILY_BASE_URL}/search"
+        payload = {"api_key": api_key, **request}
+        
+        with external_call("tavily", "search") as call:
+            call["query"] = str(query)[:200]
+            start = time.perf_counter()
+            try:
+                if cancel_token is None:
+                    response = requests.post(url, json=payload)
+                    response.raise_for_status()  # Raise exception for 4XX/5XX responses
+                    results = response.json()
+                else:
+                    response = _post_cancellable(url, cancel_token, json=payload)
+                    response.raise_for_status()
+                    body = b"".join(_iter_cancellable(response, cancel_token))
+                    results = json.loads(body)
+                
+                call["results"] = len(results.get("results", []))
+                if api_recorder.recording:
+                    api_recorder.record("tavily", request, results, time.perf_counter() - start)
+                return results
+            except requests.exceptions.RequestException as e:
+                call["outcome"] = "error"
+                logger.error(f"Error in Tavily search: {str(e)}")
+                # Return empty results instead of raising an exception
+                return {"error": str(e), "results": []}
+            except ValueError as e:
+                call["outcome"] = "error"
+                logger.error(f"Invalid response from Tavily search: {str(e)}")
+                return {"error": str(e), "results": []}
 
 
 class GroqClient:
@@ -67,53 +194,135 @@ class GroqClient:
         prompt: str,
         system_prompt: str = None,
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        cancel_token: Optional[CancellationToken] = None
     ) -> Dict[str, Any]:
         """
         Generate text using the Groq API
         
+        When a cancellation token is given the completion is streamed, so that
+        cancelling closes the connection and stops generation server-side.
+        
         Args:
             model (str): The model to use
             prompt (str): The prompt to generate from
             system_prompt (str, optional): System prompt for the model
             temperature (float): Sampling temperature
             max_tokens (int): Maximum tokens to generate
+            cancel_token (CancellationToken, optional): Token that aborts the in-flight request
             
         Returns:
             Dict[str, Any]: The API response
         """
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        messages.append({"role": "user", "content": prompt})
+        
+        request = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        
+        if api_recorder.replaying:
+            return _replay_call("groq", model, request, cancel_token, {"error": "No recorded response"})
+        
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             logger.error("Groq API key not found in environment variables")
             return {"error": "API key not found"}
         
-        url = "https://api.groq.com/openai/v1/chat/completions"
+        url = f"{GROQ_BASE_URL}/chat/completions"
         
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
+        payload = dict(request)
         
-        messages.append({"role": "user", "content": prompt})
+        with external_call("groq", model) as call:
+            start = time.perf_counter()
+            try:
+                if cancel_token is None:
+                    response = requests.post(url, headers=headers, json=payload)
+                    response.raise_for_status()
+                    result = response.json()
+                else:
+                    payload["stream"] = True
+                    response = _post_cancellable(url, cancel_token, headers=headers, json=payload)
+                    response.raise_for_status()
+                    result = GroqClient._collect_stream(_iter_cancellable(response, cancel_token, lines=True), model)
+            except requests.exceptions.RequestException as e:
+                call["outcome"] = "error"
+                logger.error(f"Error in Groq API call: {str(e)}")
+                return {"error": str(e)}
+            except ValueError as e:
+                call["outcome"] = "error"
+                logger.error(f"Invalid response from Groq API: {str(e)}")
+                return {"error": str(e)}
+            
+            if api_recorder.recording:
+                api_recorder.record("groq", request, result, time.perf_counter() - start)
+            
+            usage = result.get("usage") or {}
+            call["prompt_tokens"] = usage.get("prompt_tokens", 0)
+            call["completion_tokens"] = usage.get("completion_tokens", 0)
+            LLM_TOKENS.inc(call["prompt_tokens"], model=model, kind="prompt")
+            LLM_TOKENS.inc(call["completion_tokens"], model=model, kind="completion")
+            return result
+    
+    @staticmethod
+    def _collect_stream(lines: Iterator[bytes], model: str) -> Dict[str, Any]:
+        """
+        Assemble streamed completion chunks into a regular completion response
+        
+        Args:
+            lines (Iterator[bytes]): Server-sent event lines
+            model (str): The requested model
+            
+        Returns:
+            Dict[str, Any]: Response in the non-streaming completion format
+        """
+        content_parts = []
+        finish_reason = None
+        usage = None
+        response_id = None
         
-        payload = {
+        for line in lines:
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                break
+            
+            chunk = json.loads(data)
+            response_id = chunk.get("id", response_id)
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {})
+                if delta.get("content"):
+                    content_parts.append(delta["content"])
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+            
+            # Groq reports usage in the final chunk under x_groq
+            usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+        
+        response = {
+            "id": response_id,
             "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(content_parts)},
+                "finish_reason": finish_reason
+            }]
         }
-        
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error in Groq API call: {str(e)}")
-            return {"error": str(e)}
+        if usage:
+            response["usage"] = usage
+        return response
     
     @staticmethod
     def extract_json_from_text(text: str) -> Any:
@@ -0,0 +1,344 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from utils.api_clients import GroqClient, _replay_call
+from utils.cancellation import CancellationToken, ResearchCancelled
+from utils.metrics import external_call, LLM_TOKENS
+from utils.replay import api_recorder
+from config import TAVILY_BASE_URL, GROQ_BASE_URL, ASYNC_HTTP_MAX_CONNECTIONS
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# Event loop of the ASGI server and the HTTP client bound to it
+_loop = None
+_client = None
+
+# Futures of calls submitted to the loop that have not finished, with their tasks once started
+_pending = {}
+_pending_lock = threading.Lock()
+
+# How often a thread waiting on the loop checks that the loop is still running
+_LOOP_CHECK_INTERVAL = 1.0
+
+class LoopClosed(RuntimeError):
+    """The event loop went away before a submitted call finished"""
+
+def bind_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    """
+    Route the external calls of research jobs to an event loop, normally the ASGI server's
+
+    Args:
+        loop (asyncio.AbstractEventLoop): The running event loop
+
+    Returns:
+        bool: Whether async calls are enabled, which needs the optional httpx package
+    """
+    global _loop, _client
+    if httpx is None:
+        logger.warning("httpx is not installed, research jobs keep using blocking HTTP calls")
+        return False
+
+    _loop = loop
+    _client = httpx.AsyncClient(
+        timeout=httpx.Timeout(None, connect=30.0),
+        limits=httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS)
+    )
+    logger.info(f"Research jobs use async HTTP calls with up to {ASYNC_HTTP_MAX_CONNECTIONS} connections")
+    return True
+
+async def unbind_loop() -> None:
+    """Fail the calls still submitted to the loop, close the HTTP client and return to blocking calls"""
+    global _loop, _client
+    client, _loop, _client = _client, None, None
+
+    with _pending_lock:
+        pending = list(_pending.items())
+        _pending.clear()
+    for future, task in pending:
+        if task is not None:
+            task.cancel()
+        _fail(future, LoopClosed("Event loop closed"))
+
+    if client is not None:
+        await client.aclose()
+
+def _fail(future: concurrent.futures.Future, error: BaseException) -> None:
+    """Set an exception on a future unless it already finished or was cancelled"""
+    try:
+        future.set_exception(error)
+    except concurrent.futures.InvalidStateError:
+        pass
+
+def loop_bound() -> bool:
+    """Whether external calls can be submitted to an event loop"""
+    return _loop is not None
+
+def submit(coroutine_function: Callable[..., Awaitable[Any]], *args, **kwargs) -> concurrent.futures.Future:
+    """
+    Run a coroutine on the bound event loop from a worker thread, keeping the
+    caller's context variables so spans land in the research trace
+
+    Args:
+        coroutine_function: The async function to run
+        *args, **kwargs: Its arguments
+
+    Returns:
+        concurrent.futures.Future: Future of the coroutine's result
+
+    Raises:
+        LoopClosed: If no event loop is bound or it has been closed
+    """
+    loop = _loop
+    if loop is None:
+        raise LoopClosed("No event loop is bound")
+
+    future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def copy_outcome(task: asyncio.Task) -> None:
+        with _pending_lock:
+            _pending.pop(future, None)
+        if future.done():
+            return
+        if task.cancelled():
+            _fail(future, ResearchCancelled("Request cancelled"))
+        elif task.exception() is not None:
+            _fail(future, task.exception())
+        else:
+            try:
+                future.set_result(task.result())
+            except concurrent.futures.InvalidStateError:
+                pass
+
+    def start() -> None:
+        if _loop is not loop:
+            # The loop was unbound before the call started
+            with _pending_lock:
+                _pending.pop(future, None)
+            _fail(future, LoopClosed("Event loop closed"))
+            return
+        if not future.set_running_or_notify_cancel():
+            with _pending_lock:
+                _pending.pop(future, None)
+            return
+        # A task runs in a copy of the context it is created in
+        task = context.run(loop.create_task, coroutine_function(*args, **kwargs))
+        with _pending_lock:
+            if future in _pending:
+                _pending[future] = task
+        task.add_done_callback(copy_outcome)
+
+    with _pending_lock:
+        _pending[future] = None
+    try:
+        loop.call_soon_threadsafe(start)
+    except RuntimeError:
+        with _pending_lock:
+            _pending.pop(future, None)
+        raise LoopClosed("Event loop closed")
+    return future
+
+def _wait_result(future: concurrent.futures.Future, loop: asyncio.AbstractEventLoop) -> Any:
+    """Wait for a submitted call, failing if its loop stops before completing it"""
+    while True:
+        try:
+            return future.result(timeout=_LOOP_CHECK_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            if not future.done() and (loop.is_closed() or not loop.is_running()):
+                with _pending_lock:
+                    _pending.pop(future, None)
+                _fail(future, LoopClosed("Event loop stopped"))
+
+async def _cancellable(awaitable: Awaitable[Any], cancel_token: Optional[CancellationToken]) -> Any:
+    """Await a call, cancelling it as soon as the token is cancelled from any thread"""
+    if cancel_token is None:
+        return await awaitable
+
+    cancel_token.raise_if_cancelled()
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(awaitable)
+    unregister = cancel_token.register(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if cancel_token.cancelled:
+            raise ResearchCancelled("Request cancelled")
+        raise
+    finally:
+        unregister()
+
+class AsyncTavilyClient:
+    """Async client for the Tavily API, with the same behaviour as TavilyClient"""
+
+    @staticmethod
+    async def search(
+        query: str,
+        search_depth: str = "advanced",
+        max_results: int = 5,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a search using the Tavily API
+
+        Args:
+            query (str): The search query
+            search_depth (str): The depth of search ('basic' or 'advanced')
+            max_results (int): Maximum number of results to return
+            cancel_token (CancellationToken, optional): Token that aborts the in-flight request
+
+        Returns:
+            Dict[str, Any]: The search results
+        """
+        if isinstance(query, dict):
+            query = query.get('query', str(query))
+
+        request = {
+            "query": query,
+            "search_depth": search_depth,
+            "max_results": max_results
+        }
+
+        if api_recorder.replaying:
+            return await asyncio.to_thread(
+                _replay_call, "tavily", "search", request, cancel_token, {"error": "No recorded response", "results": []}
+            )
+
+        api_key = os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            logger.error("Tavily API key not found in environment variables")
+            return {"error": "API key not found", "results": []}
+
+        payload = {"api_key": api_key, **request}
+
+        with external_call("tavily", "search") as call:
+            call["query"] = str(query)[:200]
+            start = time.perf_counter()
+            try:
+                response = await _cancellable(_client.post(f"{TAVILY_BASE_URL}/search", json=payload), cancel_token)
+                response.raise_for_status()
+                results = response.json()
+
+                call["results"] = len(results.get("results", []))
+                if api_recorder.recording:
+                    api_recorder.record("tavily", request, results, time.perf_counter() - start)
+                return results
+            except httpx.HTTPError as e:
+                call["outcome"] = "error"
+                logger.error(f"Error in Tavily search: {str(e)}")
+                return {"error": str(e), "results": []}
+            except ValueError as e:
+                call["outcome"] = "error"
+                logger.error(f"Invalid response from Tavily search: {str(e)}")
+                return {"error": str(e), "results": []}
+
+class AsyncGroqClient:
+    """Async client for the Groq API, with the same behaviour as GroqClient"""
+
+    @staticmethod
+    async def generate_text(
+        model: str,
+        prompt: str,
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate text using the Groq API. The completion is always streamed, so
+        cancelling closes the connection and stops generation server-side.
+
+        Args:
+            model (str): The model to use
+            prompt (str): The prompt to generate from
+            system_prompt (str, optional): System prompt for the model
+            temperature (float): Sampling temperature
+            max_tokens (int): Maximum tokens to generate
+            cancel_token (CancellationToken, optional): Token that aborts the in-flight request
+
+        Returns:
+            Dict[str, Any]: The API response
+        """
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        request = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+        if api_recorder.replaying:
+            return await asyncio.to_thread(_replay_call, "groq", model, request, cancel_token, {"error": "No recorded response"})
+
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            logger.error("Groq API key not found in environment variables")
+            return {"error": "API key not found"}
+
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = dict(request, stream=True)
+
+        async def stream_lines():
+            async with _client.stream("POST", f"{GROQ_BASE_URL}/chat/completions", headers=headers, json=payload) as response:
+                response.raise_for_status()
+                return [line.encode("utf-8") async for line in response.aiter_lines()]
+
+        with external_call("groq", model) as call:
+            start = time.perf_counter()
+            try:
+                lines = await _cancellable(stream_lines(), cancel_token)
+                result = GroqClient._collect_stream(iter(lines), model)
+            except httpx.HTTPError as e:
+                call["outcome"] = "error"
+                logger.error(f"Error in Groq API call: {str(e)}")
+                return {"error": str(e)}
+            except ValueError as e:
+                call["outcome"] = "error"
+                logger.error(f"Invalid response from Groq API: {str(e)}")
+                return {"error": str(e)}
+
+            if api_recorder.recording:
+                api_recorder.record("groq", request, result, time.perf_counter() - start)
+
+            usage = result.get("usage") or {}
+            call["prompt_tokens"] = usage.get("prompt_tokens", 0)
+            call["completion_tokens"] = usage.get("completion_tokens", 0)
+            LLM_TOKENS.inc(call["prompt_tokens"], model=model, kind="prompt")
+            LLM_TOKENS.inc(call["completion_tokens"], model=model, kind="completion")
+            return result
+
+def generate_text(**kwargs) -> Dict[str, Any]:
+    """
+    Generate text with GroqClient, or with AsyncGroqClient on the bound event loop
+    in ASGI mode, where the calling thread only waits for the result. Falls back to
+    GroqClient if the loop goes away before the call completes.
+
+    Args:
+        **kwargs: Arguments of GroqClient.generate_text
+
+    Returns:
+        Dict[str, Any]: The API response
+    """
+    loop = _loop
+    if loop is not None:
+        try:
+            return _wait_result(submit(AsyncGroqClient.generate_text, **kwargs), loop)
+        except LoopClosed:
+            logger.warning("Event loop closed during a Groq call, retrying with a blocking call")
+    return GroqClient.generate_text(**kwargs)
@@ -0,0 +1,93 @@
+import threading
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+class ResearchCancelled(Exception):
+    """Raised when work is aborted because its cancellation token was cancelled"""
+
+
+class CancellationToken:
+    """Thread-safe cancellation signal shared by the stages of one research job"""
+
+    def __init__(self):
+        """Initialize the cancellation token"""
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether cancellation has been requested"""
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """Request cancellation and run every registered callback once"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Error in cancellation callback: {str(e)}")
+
+    def raise_if_cancelled(self) -> None:
+        """Raise ResearchCancelled if cancellation has been requested"""
+        if self._event.is_set():
+            raise ResearchCancelled("Research was cancelled")
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until cancellation is requested or the timeout expires
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait
+
+        Returns:
+            bool: True if cancellation was requested
+        """
+        return self._event.wait(timeout)
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback to run on cancellation, e.g. closing an open HTTP response.
+        The callback runs immediately if the token is already cancelled.
+
+        Args:
+            callback: Function called without arguments on cancellation
+
+        Returns:
+            Callable: Function that unregisters the callback
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def unregister():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return unregister
+
+        callback()
+        return lambda: None
+
+    def child(self) -> "CancellationToken":
+        """
+        Create a token that is cancelled with this one but can also be cancelled on
+        its own, to abort one part of a job without stopping the rest
+
+        Returns:
+            CancellationToken: The child token
+        """
+        child = CancellationToken()
+        unregister = self.register(child.cancel)
+        child.register(unregister)
+        return child
@@ -0,0 +1,240 @@
+import math
+import random
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.text_utils import tokenize, stem
+
+# Query parameters that identify the visit rather than the document. Only parameters
+# set by known ad, analytics and mailing tools: generic names such as ref or output
+# select content on many sites (e.g. a GitHub branch)
+TRACKING_PARAMS = frozenset([
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "yclid",
+    "ref_src", "cmpid"
+])
+TRACKING_PREFIXES = ("utm_", "_hs", "hsa_", "pk_", "mtm_")
+
+_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a URL to a canonical form so that the same page under tracking
+    parameters, mobile or AMP hosts and AMP cache URLs maps to one key
+
+    Args:
+        url (str): The URL
+
+    Returns:
+        str: The canonical URL, or an empty string if there is no usable URL
+    """
+    if not url or url == "#":
+        return ""
+
+    try:
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        # Malformed netloc, e.g. a non-numeric port or unbalanced IPv6 brackets
+        return url.strip().lower()
+    path = parts.path
+
+    # Unwrap AMP cache URLs: google.com/amp/s/<host>/<path> and <x>.cdn.ampproject.org/c/s/<host>/<path>
+    for marker in ("/amp/s/", "/c/s/", "/v/s/"):
+        if (host.startswith("www.google.") or host.endswith(".cdn.ampproject.org")) and path.startswith(marker):
+            return canonicalize_url("https://" + path[len(marker):] + (f"?{parts.query}" if parts.query else ""))
+
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+
+    # AMP variants of a page usually live under a trailing /amp segment
+    path = path.rstrip("/")
+    if path.endswith("/amp"):
+        path = path[:-len("/amp")]
+    if path.endswith((".amp.html", ".amp")):
+        path = path.rsplit(".amp", 1)[0]
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+
+    return urlunsplit(("https", host, path or "/", urlencode(query), ""))
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """
+    Hash the word n-grams of a text
+
+    Args:
+        text (str): The text
+        size (int): Number of words per shingle
+
+    Returns:
+        Set[int]: 32-bit hashes of the shingles
+    """
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))} if tokens else set()
+
+    return {
+        zlib.crc32(" ".join(tokens[i:i + size]).encode("utf-8"))
+        for i in range(len(tokens) - size + 1)
+    }
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """Jaccard similarity of two sets"""
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _query_vector(query: str) -> Counter:
+    """Bag of stemmed words and character trigrams of a query"""
+    words = [stem(token) for token in tokenize(query)]
+    text = " ".join(words)
+    trigrams = [text[i:i + 3] for i in range(len(text) - 2)]
+    return Counter(words) + Counter(f"#{gram}" for gram in trigrams)
+
+def _cosine(a: Counter, b: Counter) -> float:
+    """Cosine similarity of two sparse vectors"""
+    dot = sum(count * b[key] for key, count in a.items() if key in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+def query_similarity(a: str, b: str) -> float:
+    """
+    Lexical similarity of two search queries, robust to word order,
+    stopwords and inflection
+
+    Returns:
+        float: Similarity between 0 and 1
+    """
+    return _cosine(_query_vector(a), _query_vector(b))
+
+def dedupe_queries(queries: List[Any], threshold: float, existing: Optional[List[str]] = None) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Merge near-duplicate search queries, keeping the first of each group
+
+    Args:
+        queries (List): The generated queries, as strings or {"query": ...} objects; anything else is skipped
+        threshold (float): Similarity at which two queries are merged
+        existing (List[str], optional): Queries already searched, which new queries are also compared to
+
+    Returns:
+        Tuple[List[str], List[Dict]]: The kept queries and a record of each collapsed query
+    """
+    kept = []
+    collapsed = []
+    vectors = [(query, _query_vector(query)) for query in (existing or [])]
+
+    for query in queries:
+        # Models sometimes return the queries as objects instead of strings
+        if isinstance(query, dict):
+            query = query.get('query')
+        if not isinstance(query, str) or not query.strip():
+            continue
+        query = query.strip()
+
+        vector = _query_vector(query)
+        best_query, best_similarity = None, 0.0
+        for other, other_vector in vectors:
+            similarity = _cosine(vector, other_vector)
+            if similarity > best_similarity:
+                best_query, best_similarity = other, similarity
+
+        if best_query is not None and best_similarity >= threshold:
+            collapsed.append({"query": query, "merged_into": best_query, "similarity": round(best_similarity, 3)})
+            continue
+
+        kept.append(query)
+        vectors.append((query, vector))
+
+    return kept, collapsed
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures with locality-sensitive hashing, to find texts that are
+    near-duplicates of one already added without comparing every pair
+    """
+
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, min_shingles: int = 5, seed: int = 1):
+        """
+        Initialize the index
+
+        Args:
+            threshold (float): Estimated Jaccard similarity at which texts count as duplicates
+            num_perm (int): Number of MinHash permutations
+            bands (int): Number of LSH bands, must divide num_perm
+            min_shingles (int): Texts with fewer shingles are never treated as duplicates
+            seed (int): Seed for the permutations
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_shingles = min_shingles
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME))
+            for _ in range(num_perm)
+        ]
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, List[int]] = {}
+
+    def signature(self, shingle_set: Set[int]) -> List[int]:
+        """Compute the MinHash signature of a set of shingle hashes"""
+        prime = self._PRIME
+        return [
+            min((a * value + b) % prime for value in shingle_set)
+            for a, b in self._permutations
+        ]
+
+    def _estimate(self, a: List[int], b: List[int]) -> float:
+        """Estimate the Jaccard similarity of two signatures"""
+        return sum(1 for x, y in zip(a, b) if x == y) / self.num_perm
+
+    def add(self, key: str, text: str) -> Optional[str]:
+        """
+        Add a text unless it is a near-duplicate of a text already in the index
+
+        Args:
+            key (str): Identifier of the text
+            text (str): The text
+
+        Returns:
+            Optional[str]: Key of the earlier near-duplicate, or None if the text was added
+        """
+        shingle_set = shingles(text)
+        if len(shingle_set) < self.min_shingles:
+            return None
+
+        signature = self.signature(shingle_set)
+        band_keys = [
+            tuple(signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+        candidates = []
+        for band, band_key in enumerate(band_keys):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate not in candidates:
+                    candidates.append(candidate)
+
+        for candidate in candidates:
+            if self._estimate(signature, self._signatures[candidate]) >= self.threshold:
+                return candidate
+
+        self._signatures[key] = signature
+        for band, band_key in enumerate(band_keys):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+        return None
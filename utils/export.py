@@ -0,0 +1,120 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+from utils.http_cache import gzip_chunks
+
+# Uncompressed bytes collected before each chunk is handed to the compressor
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def _json_default(value: Any) -> Any:
+    """Serialize the non-JSON types found in chat documents"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def chat_to_json(chat: Dict[str, Any]) -> bytes:
+    """Serialize a chat as one JSON line"""
+    return (json.dumps(chat, default=_json_default, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _jsonl_chunks(chats: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """JSON lines of the chats, joined into chunks of about EXPORT_CHUNK_BYTES"""
+    pending = []
+    pending_bytes = 0
+
+    for chat in chats:
+        line = chat_to_json(chat)
+        pending.append(line)
+        pending_bytes += len(line)
+        if pending_bytes >= EXPORT_CHUNK_BYTES:
+            yield b"".join(pending)
+            pending, pending_bytes = [], 0
+
+    yield b"".join(pending)
+
+def gzip_jsonl(chats: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Stream chats as gzip-compressed JSON lines, holding at most one chunk in memory
+
+    Args:
+        chats (Iterable[Dict]): The chats, e.g. from iter_chats
+
+    Yields:
+        bytes: Pieces of the gzip stream
+    """
+    return gzip_chunks(_jsonl_chunks(chats))
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """Datetime from a stored datetime or an exported ISO string"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+def chat_row(chat: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a chat into a row of the columnar export"""
+    references = chat.get("references") or []
+    analysis = chat.get("analysis") or ""
+    return {
+        "id": str(chat.get("_id", "")),
+        "query": chat.get("query", ""),
+        "status": chat.get("status", ""),
+        "created_at": _timestamp(chat.get("created_at")),
+        "completed_at": _timestamp(chat.get("completed_at")),
+        "search_queries": [str(query) for query in chat.get("search_queries") or []],
+        "reference_count": len(references),
+        "reference_urls": [ref.get("url", "") for ref in references if isinstance(ref, dict)],
+        "analysis": analysis,
+        "analysis_words": len(analysis.split()),
+        "research_rounds": len(chat.get("research_rounds") or [])
+    }
+
+def write_parquet(chats: Iterable[Dict[str, Any]], path: str, batch_rows: int = 1000) -> int:
+    """
+    Write chats to a Parquet file one row group at a time. Needs the optional pyarrow package.
+
+    Args:
+        chats (Iterable[Dict]): The chats
+        path (str): Output file
+        batch_rows (int): Rows per row group
+
+    Returns:
+        int: Number of chats written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Columnar export needs the pyarrow package (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("query", pa.string()),
+        ("status", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        ("completed_at", pa.timestamp("us")),
+        ("search_queries", pa.list_(pa.string())),
+        ("reference_count", pa.int32()),
+        ("reference_urls", pa.list_(pa.string())),
+        ("analysis", pa.string()),
+        ("analysis_words", pa.int32()),
+        ("research_rounds", pa.int32())
+    ])
+
+    count = 0
+    rows = []
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chat in chats:
+            rows.append(chat_row(chat))
+            if len(rows) >= batch_rows:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            count += len(rows)
+
+    return count
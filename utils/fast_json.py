@@ -0,0 +1,115 @@
+import json
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
+from flask.json.provider import DefaultJSONProvider
+from config import JSON_BACKEND
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from bson import ObjectId
+except ImportError:
+    ObjectId = None
+
+logger = logging.getLogger(__name__)
+
+# Bytes of serialized items collected before each chunk of a streamed array
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_use_orjson = JSON_BACKEND == "orjson" and orjson is not None
+if JSON_BACKEND == "orjson" and orjson is None:
+    logger.warning("orjson is not installed, falling back to the json module")
+BACKEND = "orjson" if _use_orjson else "json"
+
+# Datetimes are passed to json_default so they keep the HTTP date format Flask has always sent
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+def json_default(value: Any) -> Any:
+    """Serialize MongoDB ObjectIds and everything Flask's JSON provider handles"""
+    if ObjectId is not None and isinstance(value, ObjectId):
+        return str(value)
+    return DefaultJSONProvider.default(value)
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON with the configured backend"""
+    if _use_orjson:
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class _JsonArrayChunker:
+    """Serializes the items of a JSON array and collects them into chunks of about chunk_bytes"""
+
+    def __init__(self, chunk_bytes: int):
+        self.chunk_bytes = chunk_bytes
+        self._pending = [b"["]
+        self._pending_bytes = 1
+        self._first = True
+
+    def add(self, item: Any) -> Optional[bytes]:
+        """Add an item, returning a chunk once enough bytes are collected"""
+        data = dumps(item)
+        if not self._first:
+            self._pending.append(b",")
+        self._first = False
+        self._pending.append(data)
+        self._pending_bytes += len(data) + 1
+        if self._pending_bytes < self.chunk_bytes:
+            return None
+
+        chunk = b"".join(self._pending)
+        self._pending, self._pending_bytes = [], 0
+        return chunk
+
+    def close(self) -> bytes:
+        """The last chunk, closing the array"""
+        self._pending.append(b"]")
+        return b"".join(self._pending)
+
+def iter_json_array(items: Iterable[Any], chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Serialize items as a JSON array in chunks, so the whole list is never built or held
+
+    Args:
+        items (Iterable): The items, e.g. documents from a cursor
+        chunk_bytes (int): Size at which a chunk is yielded
+
+    Yields:
+        bytes: Pieces of the JSON array
+    """
+    chunker = _JsonArrayChunker(chunk_bytes)
+    for item in items:
+        chunk = chunker.add(item)
+        if chunk:
+            yield chunk
+    yield chunker.close()
+
+async def aiter_json_array(items: AsyncIterable[Any], chunk_bytes: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """Async counterpart of iter_json_array, for items from an async cursor"""
+    chunker = _JsonArrayChunker(chunk_bytes)
+    async for item in items:
+        chunk = chunker.add(item)
+        if chunk:
+            yield chunk
+    yield chunker.close()
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider serializing with orjson, and ObjectIds without converting them first"""
+
+    # Key order is kept as inserted; sorting costs time on every response
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # jsonify asks for compact separators, which is what orjson writes; other options
+        # such as indent in debug mode are only supported by the json module
+        if _use_orjson and set(kwargs) <= {"separators"} and kwargs.get("separators", (",", ":")) == (",", ":"):
+            return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS).decode("utf-8")
+        kwargs.setdefault("default", json_default)
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if not _use_orjson or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
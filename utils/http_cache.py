@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import logging
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, Optional
+from flask import current_app, request, Response
+from werkzeug.datastructures import Accept, ETags
+from config import COMPRESSION_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY
+from utils.fast_json import iter_json_array
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/css", "application/javascript")
+
+# Suffixes added to a strong ETag for each content coding, since each coding is a different representation
+_ENCODING_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+
+def make_etag(*parts: Any) -> str:
+    """
+    Derive an opaque ETag value from a version or content
+
+    Args:
+        *parts: Strings or bytes identifying the representation, e.g. chat ID and version
+
+    Returns:
+        str: The ETag value without quotes
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+def etag_matches(if_none_match: ETags, etag: str) -> bool:
+    """Whether parsed If-None-Match values match the ETag in any content coding"""
+    if not if_none_match:
+        return False
+    return any(if_none_match.contains(etag + suffix) for suffix in ("", *_ENCODING_SUFFIXES.values()))
+
+def is_not_modified(etag: str) -> bool:
+    """Whether the request's If-None-Match matches the ETag in any content coding"""
+    return etag_matches(request.if_none_match, etag)
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response for an ETag"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def cached_json(payload: Any, etag: Optional[str] = None) -> Response:
+    """
+    JSON response with a strong ETag, or a 304 if the client already has it
+
+    Args:
+        payload: The JSON-serializable payload
+        etag (str, optional): ETag derived from a version; defaults to a hash of the body
+
+    Returns:
+        Response: The response
+    """
+    body = current_app.json.dumps(payload)
+    etag = etag or make_etag(body)
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate before using it
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def streamed_json(items: Iterable[Any], etag: str) -> Response:
+    """
+    JSON array response serialized while it is sent, gzip-compressed on the fly if the
+    client accepts it, or a 304 if the client already has it
+
+    Args:
+        items (Iterable): The array items, e.g. documents from a cursor
+        etag (str): ETag derived from a version of the items
+
+    Returns:
+        Response: The streamed response
+    """
+    if is_not_modified(etag):
+        return not_modified(etag)
+
+    chunks = iter_json_array(items)
+    gzipped = bool(request.accept_encodings["gzip"])
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+
+    response = current_app.response_class(chunks, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = "no-cache"
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    response.set_etag(encoded_etag(etag, "gzip") if gzipped else etag)
+    return response
+
+def gzip_compressor():
+    """Incremental compressor writing a gzip stream"""
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into a gzip stream as they are produced"""
+    compressor = gzip_compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+async def agzip_chunks(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Async counterpart of gzip_chunks"""
+    compressor = gzip_compressor()
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def preferred_encoding(accepted: Accept) -> Optional[str]:
+    """Best content coding in parsed Accept-Encoding values, brotli first when it is installed"""
+    if brotli and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a body with the content coding from preferred_encoding"""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of the representation in a content coding"""
+    return etag + _ENCODING_SUFFIXES[encoding]
+
+def compress_response(response: Response) -> Response:
+    """
+    Compress a large response body with brotli or gzip if the client accepts it
+
+    Args:
+        response (Response): The response to compress
+
+    Returns:
+        Response: The response, compressed in place when worthwhile
+    """
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = preferred_encoding(request.accept_encodings)
+    data = response.get_data()
+    if not encoding or len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    response.set_data(compress_body(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak=weak)
+
+    return response
@@ -0,0 +1,291 @@
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from utils.cancellation import ResearchCancelled
+from utils.tracing import span
+
+# Latency buckets in seconds, from quick database calls to multi-minute drafting calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render a label set in the Prometheus text format"""
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _escape(value: str) -> str:
+    """Escape a label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    """Render a sample value"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class for metrics with a fixed set of label names"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Label values in label name order"""
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        """Lines of the metric in the Prometheus text format"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric with its HELP and TYPE lines"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Increase the counter for a label set"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Current value for a label set"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, either set directly or read from a function at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        """Set the gauge for a label set"""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """
+        Read the gauge from a function at scrape time
+
+        Args:
+            function: Returns a mapping from label value tuples to values
+        """
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function:
+            items = sorted(self._function().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Record an observation for a label set"""
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound) if bound == float("inf") else str(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics exposed on the /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        """Add a metric to the registry"""
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Add a function that sets gauges from one snapshot before each scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector()
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pipeline
+STAGE_DURATION = Histogram(
+    "research_stage_duration_seconds",
+    "Duration of research pipeline stages",
+    ["stage"]
+)
+RESEARCH_JOBS = Counter(
+    "research_jobs_total",
+    "Finished research jobs by outcome",
+    ["outcome"]
+)
+QUEUE_WAIT = Histogram(
+    "research_queue_wait_seconds",
+    "Time research jobs wait in the scheduler queue for a worker and rate budget",
+    ["priority"]
+)
+RATE_BUDGET_WAIT = Histogram(
+    "research_rate_budget_wait_seconds",
+    "Time batch jobs are held back because the per-minute rate budget is used up"
+)
+QUEUE_DEPTH = Gauge(
+    "research_queue_depth",
+    "Research jobs waiting in the scheduler queue",
+    ["priority"]
+)
+ACTIVE_JOBS = Gauge(
+    "research_active_jobs",
+    "Research jobs currently running"
+)
+
+# External calls
+EXTERNAL_CALL_DURATION = Histogram(
+    "external_call_duration_seconds",
+    "Duration of calls to external services",
+    ["service", "target", "outcome"]
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens used by LLM calls",
+    ["model", "kind"]
+)
+RATE_LIMIT_USAGE = Gauge(
+    "rate_limit_usage",
+    "Requests and tokens counted against each model in the current rate limit window",
+    ["model", "kind"]
+)
+RATE_LIMIT_EXHAUSTED = Counter(
+    "rate_limit_exhausted_total",
+    "Model selections made while every model had reached its rate limit"
+)
+
+# Caches
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+
+def timed_stage(stage: str, function: Callable) -> Callable:
+    """Wrap a pipeline stage so its duration is recorded"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with STAGE_DURATION.time(stage=stage):
+            return function(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def external_call(service: str, target: str):
+    """
+    Time a call to an external service and record it as a span on the current trace.
+    The outcome is "error" if the block raises; the block can set the outcome itself,
+    and add span attributes, through the yielded dict.
+
+    Args:
+        service (str): The service, e.g. "tavily", "groq", "mongo" or "chroma"
+        target (str): The model, endpoint or operation called
+    """
+    with span(f"{service}.{target}") as call:
+        call["outcome"] = "success"
+        start = time.perf_counter()
+        try:
+            yield call
+        except BaseException as e:
+            call["outcome"] = "cancelled" if isinstance(e, ResearchCancelled) else "error"
+            raise
+        finally:
+            EXTERNAL_CALL_DURATION.observe(time.perf_counter() - start, service=service, target=target, outcome=call["outcome"])
+
+def timed_call(service: str, target: str = None) -> Callable:
+    """Decorator form of external_call, using the function name as the default target"""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with external_call(service, target or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
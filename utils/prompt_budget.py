@@ -0,0 +1,134 @@
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from config import (
+    MODEL_TOKEN_BUDGETS,
+    MAX_OUTPUT_SHARE,
+    PROMPT_SAFETY_MARGIN,
+    MAX_REFERENCE_CHARS,
+    MIN_REFERENCE_CHARS
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text with Llama-family tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: Estimated token count
+    """
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+def model_budget(model: str) -> Dict[str, int]:
+    """Get the context window and output limit of a model"""
+    return MODEL_TOKEN_BUDGETS.get(model, MODEL_TOKEN_BUDGETS[next(iter(MODEL_TOKEN_BUDGETS))])
+
+def output_token_budget(model: str, requested: int) -> int:
+    """
+    Limit the requested completion length to what the model can produce
+    while leaving room in its context window for the prompt
+
+    Args:
+        model (str): The model name
+        requested (int): The desired maximum number of output tokens
+
+    Returns:
+        int: The max_tokens value to send
+    """
+    budget = model_budget(model)
+    return max(min(requested, budget["max_output_tokens"], int(budget["context_window"] * MAX_OUTPUT_SHARE)), 1)
+
+def _relevance(reference: Dict[str, Any]) -> float:
+    """Relevance used to decide which references keep the most content"""
+    return float(reference.get('rerank_score', reference.get('score', 0)) or 0)
+
+def _format_reference(number: int, reference: Dict[str, Any], chars: int) -> str:
+    """Format a reference for the prompt the same way the drafting prompts always have"""
+    return f"({number}) {reference['title']}:\n{reference.get('content', '').strip()[:chars]}...\n"
+
+def pack_references(
+    references: List[Dict[str, Any]],
+    model: str,
+    base_prompt: str,
+    max_output_tokens: int,
+    indices: Optional[List[int]] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Select and trim reference content so the prompt fits the model's context window.
+
+    References are first given MIN_REFERENCE_CHARS each, in order of relevance
+    (rerank score when reranked, otherwise Tavily score), and the remaining budget is then used to
+    extend them up to MAX_REFERENCE_CHARS in the same order. References keep their
+    global numbers so that citations match the stored reference list.
+
+    Args:
+        references (List[Dict]): All references of the research
+        model (str): The model the prompt is sent to
+        base_prompt (str): The prompt without any reference content
+        max_output_tokens (int): Tokens reserved for the completion
+        indices (List[int], optional): Indices of the references to consider, defaults to all
+
+    Returns:
+        Tuple[str, Dict]: The reference content and a record of the packing decision
+    """
+    budget = model_budget(model)
+    context_window = budget["context_window"]
+    base_tokens = estimate_tokens(base_prompt)
+    available_tokens = int(context_window * (1 - PROMPT_SAFETY_MARGIN)) - max_output_tokens - base_tokens
+    available_chars = max(available_tokens, 0) * CHARS_PER_TOKEN
+
+    if indices is None:
+        indices = list(range(len(references)))
+    candidates = [i for i in indices if references[i].get('content', '').strip()]
+    ranked = sorted(candidates, key=lambda i: _relevance(references[i]), reverse=True)
+
+    # First pass: as many references as possible with a short excerpt
+    allotted = {}
+    used_chars = 0
+    for i in ranked:
+        content_chars = min(len(references[i]['content'].strip()), MIN_REFERENCE_CHARS)
+        cost = len(_format_reference(i + 1, references[i], content_chars))
+        if used_chars + cost > available_chars:
+            continue
+        allotted[i] = content_chars
+        used_chars += cost
+
+    # Second pass: extend the most relevant references up to the full excerpt
+    for i in ranked:
+        if i not in allotted:
+            continue
+        full_chars = min(len(references[i]['content'].strip()), MAX_REFERENCE_CHARS)
+        extra = min(full_chars - allotted[i], available_chars - used_chars)
+        if extra <= 0:
+            continue
+        allotted[i] += extra
+        used_chars += extra
+
+    reference_content = "\n".join(_format_reference(i + 1, references[i], allotted[i]) for i in sorted(allotted))
+
+    decision = {
+        "model": model,
+        "context_window": context_window,
+        "max_output_tokens": max_output_tokens,
+        "base_prompt_tokens": base_tokens,
+        "reference_budget_tokens": max(available_tokens, 0),
+        "estimated_prompt_tokens": base_tokens + estimate_tokens(reference_content),
+        "references_considered": len(candidates),
+        "references_included": len(allotted),
+        "references_trimmed": sum(
+            1 for i, chars in allotted.items()
+            if chars < min(len(references[i]['content'].strip()), MAX_REFERENCE_CHARS)
+        ),
+        "dropped_references": sorted(i + 1 for i in candidates if i not in allotted)
+    }
+
+    if decision["dropped_references"]:
+        logger.info(f"Dropped {len(decision['dropped_references'])} references to fit the {model} context window")
+
+    return reference_content, decision
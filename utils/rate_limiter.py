@@ -1,7 +1,9 @@
 import time
 import logging
-from typing import Dict, Any, List
+import threading
+from typing import Dict, Any, List, Optional
 from config import GROQ_MODELS, RATE_LIMITS
+from utils.metrics import RATE_LIMIT_EXHAUSTED, RATE_LIMIT_USAGE
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,7 @@ class RateLimiter:
         self.last_request_time = {}
         self.request_counts = {}
         self.token_counts = {}
+        self._lock = threading.RLock()
         
         # Initialize counters for each model
         for model in self.models:
@@ -22,6 +25,22 @@ class RateLimiter:
             self.request_counts[model] = 0
             self.token_counts[model] = 0
     
+    def _reset_expired_windows(self, current_time: float) -> None:
+        """Reset the counters of models whose last request is more than a minute old. Must be called with the lock held."""
+        for model in self.models:
+            if current_time - self.last_request_time.get(model, 0) > 60:
+                self.request_counts[model] = 0
+                self.token_counts[model] = 0
+                self.last_request_time[model] = current_time
+    
+    def _usage_share(self, model: str) -> float:
+        """Largest share of a model's per-minute request or token limit used in the current window"""
+        limits = self.rate_limits[model]
+        return max(
+            self.request_counts.get(model, 0) / limits["requests_per_minute"],
+            self.token_counts.get(model, 0) / limits["tokens_per_minute"]
+        )
+    
     def get_available_model(self) -> str:
         """
         Get an available model that hasn't hit rate limits
@@ -29,24 +48,62 @@ class RateLimiter:
         Returns:
             str: The model name
         """
-        current_time = time.time()
+        with self._lock:
+            self._reset_expired_windows(time.time())
+            
+            # Find a model that hasn't hit rate limits
+            for model in self.models:
+                if self._usage_share(model) < 1:
+                    return model
+            
+            # If all models have hit rate limits, use the first one and log a warning
+            logger.warning("All models have hit rate limits. Using the first model.")
+            RATE_LIMIT_EXHAUSTED.inc()
+            return self.models[0]
+    
+    def acquire_model(self) -> str:
+        """
+        Get the least loaded model that hasn't hit rate limits and count a request
+        against it in one step, so that concurrent callers are spread across models
         
-        # Reset counters if a minute has passed
-        for model in self.models:
-            if current_time - self.last_request_time.get(model, 0) > 60:
-                self.request_counts[model] = 0
-                self.token_counts[model] = 0
-                self.last_request_time[model] = current_time
+        Returns:
+            str: The model name
+        """
+        with self._lock:
+            self._reset_expired_windows(time.time())
+            
+            available = [model for model in self.models if self._usage_share(model) < 1]
+            if available:
+                model = min(available, key=self._usage_share)
+            else:
+                logger.warning("All models have hit rate limits. Using the first model.")
+                RATE_LIMIT_EXHAUSTED.inc()
+                model = self.models[0]
+            
+            self.update_rate_limits(model, "request")
+            return model
+    
+    def acquire_spare_model(self, share: float) -> Optional[str]:
+        """
+        Get the least loaded model that has used less than a share of its per-minute limits
+        and count a request against it, for optional work that should only run on spare capacity
         
-        # Find a model that hasn't hit rate limits
-        for model in self.models:
-            if (self.request_counts.get(model, 0) < self.rate_limits[model]["requests_per_minute"] and
-                self.token_counts.get(model, 0) < self.rate_limits[model]["tokens_per_minute"]):
-                return model
+        Args:
+            share (float): Usage share below which a model may take optional work
         
-        # If all models have hit rate limits, use the first one and log a warning
-        logger.warning("All models have hit rate limits. Using the first model.")
-        return self.models[0]
+        Returns:
+            Optional[str]: The model name, or None if every model is busier than that
+        """
+        with self._lock:
+            self._reset_expired_windows(time.time())
+            
+            spare = [model for model in self.models if self._usage_share(model) < share]
+            if not spare:
+                return None
+            
+            model = min(spare, key=self._usage_share)
+            self.update_rate_limits(model, "request")
+            return model
     
     def update_rate_limits(self, model: str, limit_type: str, count: int = 1) -> None:
         """
@@ -57,25 +114,40 @@ class RateLimiter:
             limit_type (str): The type of limit ('request' or 'tokens')
             count (int): The count to add
         """
-        current_time = time.time()
-        
-        # Reset counters if a minute has passed
-        if current_time - self.last_request_time.get(model, 0) > 60:
-            self.request_counts[model] = 0
-            self.token_counts[model] = 0
-        
-        # Update the last request time
-        self.last_request_time[model] = current_time
-        
-        # Update the appropriate counter
-        if limit_type == "request":
-            self.request_counts[model] = self.request_counts.get(model, 0) + 1
-        elif limit_type == "tokens":
-            self.token_counts[model] = self.token_counts.get(model, 0) + count
+        with self._lock:
+            current_time = time.time()
+            
+            # Reset counters if a minute has passed
+            if current_time - self.last_request_time.get(model, 0) > 60:
+                self.request_counts[model] = 0
+                self.token_counts[model] = 0
+            
+            # Update the last request time
+            self.last_request_time[model] = current_time
+            
+            # Update the appropriate counter
+            if limit_type == "request":
+                self.request_counts[model] = self.request_counts.get(model, 0) + 1
+            elif limit_type == "tokens":
+                self.token_counts[model] = self.token_counts.get(model, 0) + count
 
     def reset_usage_stats(self):
         """Reset usage statistics"""
-        for model in self.models:
-            self.request_counts[model] = 0
-            self.token_counts[model] = 0
+        with self._lock:
+            for model in self.models:
+                self.request_counts[model] = 0
+                self.token_counts[model] = 0
+    
+    def usage(self) -> Dict[tuple, int]:
+        """Requests and tokens counted against each model in the current window"""
+        with self._lock:
+            usage = {}
+            for model in self.models:
+                usage[(model, "requests")] = self.request_counts.get(model, 0)
+                usage[(model, "tokens")] = self.token_counts.get(model, 0)
+            return usage
+
+# Rate limiter shared by all agents in the process
+rate_limiter = RateLimiter()
+RATE_LIMIT_USAGE.set_function(rate_limiter.usage)
 
@@ -0,0 +1,145 @@
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional
+from utils.cancellation import CancellationToken
+from config import API_REPLAY_MODE, API_REPLAY_FILE, API_REPLAY_LATENCY_SCALE
+
+logger = logging.getLogger(__name__)
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+class ApiRecorder:
+    """Records external API interactions to a file, or serves them back from one"""
+
+    def __init__(self, mode: str = "", path: str = API_REPLAY_FILE, latency_scale: float = 1.0):
+        """
+        Initialize the recorder
+
+        Args:
+            mode (str): "record", "replay", or empty to pass requests through
+            path (str): Gzipped JSON lines file the interactions are stored in
+            latency_scale (float): Factor applied to recorded latencies when replaying, 0 to answer immediately
+        """
+        self.mode = mode.lower()
+        self.path = path
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._recordings = None
+        self._file = None
+
+        if self.mode not in ("", MODE_RECORD, MODE_REPLAY):
+            logger.warning(f"Unknown API_REPLAY_MODE '{mode}', passing requests through")
+            self.mode = ""
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == MODE_RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    @staticmethod
+    def request_key(service: str, request: Dict[str, Any]) -> str:
+        """Stable key of a request, covering every field including the Groq model"""
+        canonical = json.dumps(
+            request,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha1(f"{service}:{canonical}".encode("utf-8")).hexdigest()
+
+    def record(self, service: str, request: Dict[str, Any], response: Dict[str, Any], latency: float) -> None:
+        """
+        Append an interaction to the recording
+
+        Args:
+            service (str): "tavily" or "groq"
+            request (Dict): The request payload without credentials
+            response (Dict): The response in the client's return format
+            latency (float): Seconds the call took
+        """
+        entry = {
+            "service": service,
+            "key": self.request_key(service, request),
+            "recorded_at": time.time(),
+            "latency": round(latency, 4),
+            "request": request,
+            "response": response
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            # One gzip stream per process, so lines are compressed together; each line is
+            # sync-flushed, so the file stays readable up to the last line if the process dies
+            if self._file is None:
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+                atexit.register(self.close)
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        """Finish the recording's gzip stream"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _load(self) -> Dict[str, deque]:
+        """Read the recording into per-key queues in recorded order"""
+        recordings = defaultdict(deque)
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as recording:
+                for line in recording:
+                    if line.strip():
+                        entry = json.loads(line)
+                        recordings[entry["key"]].append(entry)
+        except EOFError:
+            # A recording process that did not exit cleanly leaves its gzip stream unfinished
+            logger.warning(f"API recording {self.path} is not finished, using the lines recorded so far")
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading API recording {self.path}: {str(e)}")
+
+        logger.info(f"Loaded {sum(len(entries) for entries in recordings.values())} recorded API interactions from {self.path}")
+        return recordings
+
+    def replay(self, service: str, request: Dict[str, Any], cancel_token: Optional[CancellationToken] = None) -> Optional[Dict[str, Any]]:
+        """
+        Serve a recorded response, waiting the recorded latency times the latency scale.
+        Repeated identical requests get the recorded responses in order, and the last
+        one once they run out.
+
+        Args:
+            service (str): "tavily" or "groq"
+            request (Dict): The request payload without credentials
+            cancel_token (CancellationToken, optional): Token that aborts the wait
+
+        Returns:
+            Optional[Dict]: The recorded response, or None if the request was never recorded
+        """
+        key = self.request_key(service, request)
+        with self._lock:
+            if self._recordings is None:
+                self._recordings = self._load()
+            entries = self._recordings.get(key)
+            if not entries:
+                return None
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+
+        delay = entry["latency"] * self.latency_scale
+        if cancel_token:
+            cancel_token.wait(delay)
+            cancel_token.raise_if_cancelled()
+        elif delay > 0:
+            time.sleep(delay)
+
+        return entry["response"]
+
+# Recorder shared by the API clients, configured from the environment
+api_recorder = ApiRecorder(API_REPLAY_MODE, API_REPLAY_FILE, API_REPLAY_LATENCY_SCALE)
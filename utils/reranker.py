@@ -0,0 +1,84 @@
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Any
+from utils.text_utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """
+    Score documents against a query with Okapi BM25
+
+    Args:
+        query (str): The query
+        documents (List[str]): The documents to score
+        k1 (float): Term frequency saturation
+        b (float): Document length normalization
+
+    Returns:
+        List[float]: One score per document
+    """
+    query_terms = set(tokenize(query))
+    doc_terms = [tokenize(document) for document in documents]
+    if not query_terms or not doc_terms:
+        return [0.0] * len(documents)
+
+    doc_count = len(doc_terms)
+    avg_length = sum(len(terms) for terms in doc_terms) / doc_count or 1
+    document_frequency = Counter(term for terms in doc_terms for term in set(terms) if term in query_terms)
+
+    scores = []
+    for terms in doc_terms:
+        frequencies = Counter(terms)
+        length_norm = k1 * (1 - b + b * len(terms) / avg_length)
+        score = 0.0
+        for term in query_terms:
+            tf = frequencies.get(term, 0)
+            if not tf:
+                continue
+            df = document_frequency[term]
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + length_norm)
+        scores.append(score)
+
+    return scores
+
+def rerank_references(query: str, references: List[Dict[str, Any]], top_n: int, tavily_weight: float = 0.3) -> List[Dict[str, Any]]:
+    """
+    Order references by relevance to the query and keep the best ones.
+
+    The relevance is the BM25 score of the title and content, scaled to [0, 1],
+    blended with the Tavily score. Each kept reference gets a rerank_score.
+
+    Args:
+        query (str): The original research query
+        references (List[Dict]): The deduplicated references
+        top_n (int): Number of references to keep
+        tavily_weight (float): Weight of the Tavily score in the blend
+
+    Returns:
+        List[Dict]: The kept references, most relevant first
+    """
+    if not references:
+        return []
+
+    bm25 = bm25_scores(query, [f"{ref.get('title', '')} {ref.get('content', '')}" for ref in references])
+    max_bm25 = max(bm25) or 1.0
+
+    scored = []
+    for ref, score in zip(references, bm25):
+        tavily_score = float(ref.get('score', 0) or 0)
+        scored.append((round((1 - tavily_weight) * score / max_bm25 + tavily_weight * tavily_score, 4), ref))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    reranked = []
+    for rerank_score, ref in scored[:top_n]:
+        ref = dict(ref)
+        ref['rerank_score'] = rerank_score
+        reranked.append(ref)
+
+    logger.info(f"Reranked {len(references)} references, keeping {len(reranked)}")
+
+    return reranked
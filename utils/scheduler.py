@@ -0,0 +1,275 @@
+import time
+import threading
+import logging
+from collections import deque, OrderedDict
+from typing import Callable, Dict, Any, Optional
+from config import (
+    RATE_LIMITS,
+    MAX_CONCURRENT_BATCH_RESEARCH,
+    LLM_CALLS_PER_RESEARCH,
+    TOKENS_PER_RESEARCH,
+    BATCH_BUDGET_SHARE
+)
+from utils.metrics import QUEUE_WAIT, RATE_BUDGET_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Job priorities
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+def research_budget_per_minute() -> int:
+    """
+    Estimate how many researches per minute the configured model rate limits allow
+
+    Returns:
+        int: Number of research jobs that can start per minute
+    """
+    requests_per_minute = sum(limits["requests_per_minute"] for limits in RATE_LIMITS.values())
+    tokens_per_minute = sum(limits["tokens_per_minute"] for limits in RATE_LIMITS.values())
+
+    by_requests = requests_per_minute // max(LLM_CALLS_PER_RESEARCH, 1)
+    by_tokens = tokens_per_minute // max(TOKENS_PER_RESEARCH, 1)
+
+    return max(int(min(by_requests, by_tokens)), 1)
+
+
+class _Job:
+    """A queued research job"""
+
+    __slots__ = ("job_id", "fn", "priority", "group", "enqueued_at")
+
+    def __init__(self, job_id: str, fn: Callable[[], None], priority: str, group: Optional[str]):
+        self.job_id = job_id
+        self.fn = fn
+        self.priority = priority
+        self.group = group
+        self.enqueued_at = time.time()
+
+
+class ResearchScheduler:
+    """
+    Runs research jobs on worker threads.
+
+    Interactive jobs start immediately on a thread of their own, as research
+    always has, so they never wait behind batch jobs. Batch jobs are queued for
+    a fixed pool of workers and limited to a share of the per-minute research
+    budget derived from RATE_LIMITS. Queued batch jobs are taken round-robin
+    across batches so that one large batch cannot starve another. A queued batch
+    job that an interactive request joins is promoted and starts at once.
+    """
+
+    def __init__(
+        self,
+        batch_workers: int = MAX_CONCURRENT_BATCH_RESEARCH,
+        jobs_per_minute: Optional[int] = None,
+        batch_share: float = BATCH_BUDGET_SHARE
+    ):
+        """
+        Initialize the scheduler and start its batch worker threads
+
+        Args:
+            batch_workers (int): Number of batch researches that can run concurrently
+            jobs_per_minute (int, optional): Research starts allowed per minute
+            batch_share (float): Fraction of the per-minute budget available to batch jobs
+        """
+        self.batch_workers = max(batch_workers, 1)
+        self.jobs_per_minute = jobs_per_minute or research_budget_per_minute()
+        self.batch_jobs_per_minute = max(int(self.jobs_per_minute * batch_share), 1)
+
+        self._condition = threading.Condition()
+        self._batches = OrderedDict()
+        self._running = {}
+        self._running_batch = 0
+        self._recent_starts = deque()
+        self._completed = 0
+
+        for i in range(self.batch_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"research-worker-{i}")
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, job_id: str, fn: Callable[[], None], priority: str = PRIORITY_INTERACTIVE, group: Optional[str] = None) -> None:
+        """
+        Start an interactive research job or queue a batch job
+
+        Args:
+            job_id (str): Unique job ID, normally the chat ID
+            fn: Function that runs the research
+            priority (str): PRIORITY_INTERACTIVE or PRIORITY_BATCH
+            group (str, optional): Batch ID used for fair sharing between batches
+        """
+        job = _Job(job_id, fn, priority, group)
+
+        if priority == PRIORITY_INTERACTIVE:
+            with self._condition:
+                self._start(job, time.time())
+            self._run_on_thread(job)
+            return
+
+        with self._condition:
+            self._batches.setdefault(group, deque()).append(job)
+            self._condition.notify()
+
+    def promote(self, job_id: str) -> bool:
+        """
+        Start a queued batch job now as an interactive job, for an interactive request
+        that joins it
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            bool: True if the job was still queued and has been started
+        """
+        with self._condition:
+            job = self._dequeue(job_id)
+            if job is None:
+                return False
+            job.priority = PRIORITY_INTERACTIVE
+            self._start(job, time.time())
+
+        logger.info(f"Promoted queued batch research {job_id} to interactive")
+        self._run_on_thread(job)
+        return True
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Remove a job that has not started yet
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            bool: True if the job was still queued and has been removed
+        """
+        with self._condition:
+            return self._dequeue(job_id) is not None
+
+    def _dequeue(self, job_id: str) -> Optional[_Job]:
+        """Remove a queued job and return it. Must be called with the condition held."""
+        for group, jobs in list(self._batches.items()):
+            for job in jobs:
+                if job.job_id == job_id:
+                    jobs.remove(job)
+                    if not jobs:
+                        del self._batches[group]
+                    return job
+        return None
+
+    def is_queued(self, job_id: str) -> bool:
+        """Whether the job is waiting for a worker"""
+        with self._condition:
+            return any(job.job_id == job_id for jobs in self._batches.values() for job in jobs)
+
+    def is_running(self, job_id: str) -> bool:
+        """Whether the job is currently running"""
+        with self._condition:
+            return job_id in self._running
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of the scheduler state
+
+        Returns:
+            Dict[str, Any]: Queue depths, running jobs and budget usage
+        """
+        with self._condition:
+            self._expire_starts(time.time())
+            return {
+                "batch_workers": self.batch_workers,
+                "running": len(self._running),
+                "running_batch": self._running_batch,
+                "queued_batch": sum(len(jobs) for jobs in self._batches.values()),
+                "started_last_minute": len(self._recent_starts),
+                "jobs_per_minute": self.jobs_per_minute,
+                "batch_jobs_per_minute": self.batch_jobs_per_minute,
+                "completed": self._completed
+            }
+
+    def _expire_starts(self, now: float) -> None:
+        """Drop job start times older than one minute"""
+        while self._recent_starts and now - self._recent_starts[0] > 60:
+            self._recent_starts.popleft()
+
+    def _next_job(self, now: float):
+        """
+        Pick the next job to run. Must be called with the condition held.
+
+        Returns:
+            Tuple of the job (or None) and how long to wait before retrying
+        """
+        self._expire_starts(now)
+
+        if not self._batches:
+            return None, None
+
+        if self._running_batch >= self.batch_workers:
+            return None, None
+
+        if len(self._recent_starts) >= self.batch_jobs_per_minute:
+            # Wait until the oldest start leaves the one-minute window
+            return None, max(60 - (now - self._recent_starts[0]), 0.1)
+
+        # Round-robin between batches
+        group, jobs = next(iter(self._batches.items()))
+        job = jobs.popleft()
+        del self._batches[group]
+        if jobs:
+            self._batches[group] = jobs
+
+        return job, None
+
+    def _start(self, job: _Job, now: float) -> None:
+        """Count a job as running. Must be called with the condition held."""
+        self._recent_starts.append(now)
+        self._running[job.job_id] = job
+        if job.priority == PRIORITY_BATCH:
+            self._running_batch += 1
+
+    def _run_on_thread(self, job: _Job) -> None:
+        """Run a started job on a thread of its own"""
+        thread = threading.Thread(target=self._run, args=(job,), name=f"research-{job.job_id}")
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, job: _Job) -> None:
+        """Run a started job and release its slot"""
+        wait = time.time() - job.enqueued_at
+        logger.info(f"Starting {job.priority} research {job.job_id} after {wait:.1f}s in queue")
+        QUEUE_WAIT.observe(wait, priority=job.priority)
+
+        try:
+            job.fn()
+        except Exception as e:
+            logger.error(f"Unhandled error in research job {job.job_id}: {str(e)}")
+        finally:
+            with self._condition:
+                self._running.pop(job.job_id, None)
+                if job.priority == PRIORITY_BATCH:
+                    self._running_batch -= 1
+                self._completed += 1
+                # A freed worker can immediately take the next queued job
+                self._condition.notify_all()
+
+    def _worker_loop(self) -> None:
+        """Run queued batch jobs until the process exits"""
+        while True:
+            with self._condition:
+                held_since = None
+                while True:
+                    job, retry_after = self._next_job(time.time())
+                    if job:
+                        break
+                    if retry_after is None:
+                        held_since = None
+                    elif held_since is None:
+                        held_since = time.time()
+                    self._condition.wait(retry_after)
+
+                now = time.time()
+                self._start(job, now)
+
+            RATE_BUDGET_WAIT.observe(now - held_since if held_since else 0)
+
+            self._run(job)
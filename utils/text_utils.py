@@ -0,0 +1,116 @@
+import re
+import html
+import unicodedata
+from typing import List
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s\.\?\!,;:]+$")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_WORD_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a research query so that trivially different spellings
+    of the same request map to the same key
+
+    Args:
+        query (str): The raw query as submitted by the user
+
+    Returns:
+        str: The normalized query
+    """
+    if not query:
+        return ""
+
+    normalized = unicodedata.normalize("NFKC", query).casefold()
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip()
+    normalized = _TRAILING_PUNCT_RE.sub("", normalized)
+
+    return normalized
+
+def tokenize(text: str, remove_stopwords: bool = True) -> List[str]:
+    """
+    Split text into lowercase alphanumeric tokens
+
+    Args:
+        text (str): The text to tokenize
+        remove_stopwords (bool): Drop common English stopwords
+
+    Returns:
+        List[str]: The tokens in order of appearance
+    """
+    if not text:
+        return []
+
+    tokens = _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).casefold())
+    if remove_stopwords:
+        tokens = [token for token in tokens if token not in STOPWORDS]
+
+    return tokens
+
+def stem(token: str) -> str:
+    """Strip common English suffixes so that inflections of a word compare equal"""
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return token
+
+def highlight(text: str, query: str, max_snippets: int = 2, width: int = 160) -> List[str]:
+    """
+    Extract the passages of a text that match a search query, with matches
+    wrapped in <mark> tags. The text is HTML-escaped.
+
+    Args:
+        text (str): The text to search
+        query (str): The search query
+        max_snippets (int): Maximum number of passages
+        width (int): Approximate characters per passage
+
+    Returns:
+        List[str]: The passages, empty if no query term occurs in the text
+    """
+    stems = {stem(token) for token in tokenize(query)}
+    if not text or not stems:
+        return []
+
+    matches = [
+        match for match in _WORD_RE.finditer(text)
+        if stem(match.group().casefold()) in stems
+    ]
+
+    snippets = []
+    covered_until = -1
+    for match in matches:
+        if len(snippets) >= max_snippets:
+            break
+        if match.start() < covered_until:
+            continue
+
+        start = max(match.start() - width // 3, 0)
+        end = min(start + width, len(text))
+        covered_until = end
+
+        passage = []
+        position = start
+        for inner in matches:
+            if inner.start() < start or inner.end() > end:
+                continue
+            passage.append(html.escape(text[position:inner.start()]))
+            passage.append(f"<mark>{html.escape(inner.group())}</mark>")
+            position = inner.end()
+        passage.append(html.escape(text[position:end]))
+
+        snippet = "".join(passage).strip()
+        snippets.append(("..." if start > 0 else "") + snippet + ("..." if end < len(text) else ""))
+
+    return snippets
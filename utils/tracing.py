@@ -0,0 +1,144 @@
+import time
+import threading
+import contextvars
+import functools
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from config import MAX_TRACE_SPANS
+from utils.cancellation import ResearchCancelled
+
+# Trace and span of the code currently running, inherited by work submitted through propagate()
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Timeline of the spans recorded during one research"""
+
+    def __init__(self, chat_id: str):
+        """
+        Initialize the trace
+
+        Args:
+            chat_id (str): The chat the research belongs to
+        """
+        self.chat_id = chat_id
+        self.created_at = time.time()
+        self._origin = time.perf_counter()
+        self._spans: List[Dict[str, Any]] = []
+        self._next_id = 1
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def offset(self) -> float:
+        """Seconds since the trace was created"""
+        return time.perf_counter() - self._origin
+
+    def new_span(self, name: str, parent: Optional[int], attributes: Dict[str, Any], start: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Open a span on the trace
+
+        Returns:
+            Optional[Dict]: The span, or None if the trace already holds MAX_TRACE_SPANS spans
+        """
+        with self._lock:
+            if len(self._spans) >= MAX_TRACE_SPANS:
+                self._dropped += 1
+                return None
+            span = {
+                "id": self._next_id,
+                "parent": parent,
+                "name": name,
+                "thread": threading.current_thread().name,
+                "start": round(self.offset() if start is None else start, 4),
+                "duration": None,
+                "status": "ok",
+                "attributes": attributes
+            }
+            self._next_id += 1
+            self._spans.append(span)
+            return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form of the trace, with span offsets in seconds from its creation"""
+        with self._lock:
+            spans = [dict(span, attributes=dict(span["attributes"])) for span in self._spans]
+            dropped = self._dropped
+        return {
+            "chat_id": self.chat_id,
+            "created_at": self.created_at,
+            "duration": round(self.offset(), 4),
+            "spans": spans,
+            "dropped_spans": dropped
+        }
+
+
+def activate(trace: Trace) -> contextvars.Token:
+    """Make a trace current in this context; pass the returned token to deactivate()"""
+    return _current_trace.set(trace)
+
+def deactivate(token: contextvars.Token) -> None:
+    """Restore the trace that was current before activate()"""
+    _current_trace.reset(token)
+
+def current_trace() -> Optional[Trace]:
+    """The trace current in this context, if any"""
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Record a span on the current trace. Does nothing outside a trace.
+
+    Args:
+        name (str): Name of the span, e.g. "tavily.search"
+        **attributes: Attributes stored with the span
+
+    Yields:
+        Dict: The span attributes, which the block can add to
+    """
+    trace = _current_trace.get()
+    record = trace.new_span(name, _current_span.get(), attributes) if trace else None
+    if record is None:
+        yield attributes
+        return
+
+    token = _current_span.set(record["id"])
+    start = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except BaseException as e:
+        record["status"] = "cancelled" if isinstance(e, ResearchCancelled) else "error"
+        record["attributes"]["error"] = str(e)[:200]
+        raise
+    finally:
+        record["duration"] = round(time.perf_counter() - start, 4)
+        _current_span.reset(token)
+
+def record_span(name: str, start: float, duration: float, **attributes) -> None:
+    """Add an already finished span, with its start given as an offset into the current trace"""
+    trace = _current_trace.get()
+    if trace:
+        record = trace.new_span(name, _current_span.get(), attributes, start=start)
+        if record:
+            record["duration"] = round(duration, 4)
+
+def traced(name: str, function: Callable) -> Callable:
+    """Wrap a function so each call is recorded as a span"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+def propagate(function: Callable) -> Callable:
+    """
+    Bind a function to a copy of the current context, so spans it records on an
+    executor thread join the trace and parent span of the submitting code
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return wrapper